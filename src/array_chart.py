@@ -0,0 +1,122 @@
+from circular_chart import CircularChart, stitch_counts_for
+from stitch import StitchEnum, Direction
+import numpy as np
+
+STITCHES = tuple(StitchEnum)
+DIRECTION_CODES = {Direction.LEFT: -1, Direction.STRAIGHT: 0, Direction.RIGHT: 1}
+
+# lookup vectors indexed by stitch code
+STARTING_SIZE = np.array([st.starting_size for st in STITCHES], dtype=np.int8)
+ENDING_SIZE = np.array([st.ending_size for st in STITCHES], dtype=np.int8)
+DIRECTION = np.array([DIRECTION_CODES[st.direction] for st in STITCHES], dtype=np.int8)
+
+MIRRORED_PAIRS = [(StitchEnum.M1L, StitchEnum.M1R),
+                  (StitchEnum.LLI, StitchEnum.RLI),
+                  (StitchEnum.SSK, StitchEnum.K2TOG),
+                  (StitchEnum.SSP, StitchEnum.P2TOG),
+                  (StitchEnum.SSSK, StitchEnum.K3TOG),
+                  (StitchEnum.SSSP, StitchEnum.P3TOG),
+                  (StitchEnum.LCKK, StitchEnum.RCKK),
+                  (StitchEnum.LCPK, StitchEnum.RCKP)]
+MIRROR = np.arange(len(STITCHES), dtype=np.int8)
+for left, right in MIRRORED_PAIRS:
+    MIRROR[left.code()], MIRROR[right.code()] = right.code(), left.code()
+
+class ArrayChart:
+    """A chart as one flat int8 array of stitch codes plus row boundaries.
+
+    Row r holds codes[row_bounds[r]:row_bounds[r + 1]], in stitch order.
+    Like CircularChart payloads, the stitches are laid down contiguously
+    from the first slot; from_chart fails on a chart with gaps rather than
+    closing them up.
+    """
+    def __init__(self, num_rows, starting_stitch_count, stitch_counts, codes, row_bounds):
+        self.num_rows = num_rows
+        self.starting_stitch_count = starting_stitch_count
+        self.stitch_counts = np.asarray(stitch_counts, dtype=np.int64)
+        self.codes = np.asarray(codes, dtype=np.int8)
+        self.row_bounds = np.asarray(row_bounds, dtype=np.int64)
+        self.row_ids = np.repeat(np.arange(num_rows), np.diff(self.row_bounds))
+
+    def __repr__(self):
+        return f"ArrayChart(num_rows={self.num_rows},starting_stitch_count={self.starting_stitch_count},stitches={len(self.codes)})"
+
+    def __getitem__(self, row_num):
+        return self.codes[self.row_bounds[row_num]:self.row_bounds[row_num + 1]]
+
+    @classmethod
+    def from_chart(cls, chart):
+        return cls.from_payload(chart.to_payload())
+
+    @classmethod
+    def from_payload(cls, payload):
+        num_rows, starting_stitch_count, rows = payload
+        stitch_counts = stitch_counts_for(num_rows, starting_stitch_count)
+        row_bounds = np.zeros(num_rows + 1, dtype=np.int64)
+        row_bounds[1:] = np.cumsum([len(row) for row in rows])
+        codes = np.frombuffer(b"".join(rows), dtype=np.uint8).astype(np.int8)
+        return cls(num_rows, starting_stitch_count, stitch_counts, codes, row_bounds)
+
+    def to_payload(self):
+        return (self.num_rows, self.starting_stitch_count,
+                tuple(self[row_num].astype(np.uint8).tobytes() for row_num in range(self.num_rows)))
+
+    def to_chart(self):
+        return CircularChart.from_payload(self.to_payload())
+
+    def _per_row(self, values):
+        return np.bincount(self.row_ids, weights=values, minlength=self.num_rows).astype(np.int64)
+
+    def produced(self):
+        """Stitches each row leaves on the needles."""
+        return self._per_row(ENDING_SIZE[self.codes])
+
+    def consumed(self):
+        """Stitches each row works from the row below."""
+        return self._per_row(STARTING_SIZE[self.codes])
+
+    def rows_matching_schedule(self):
+        return self.produced() == self.stitch_counts
+
+    def rows_consuming_previous_row(self):
+        # the first row is cast on, so it consumes nothing from below
+        consumed = self.consumed()
+        matching = np.ones(self.num_rows, dtype=bool)
+        matching[1:] = consumed[1:] == self.stitch_counts[:-1]
+        return matching
+
+    def verify(self):
+        return bool(self.rows_matching_schedule().all() and self.rows_consuming_previous_row().all())
+
+    def histogram(self):
+        """Number of each stitch in the chart, indexed by stitch code."""
+        return np.bincount(self.codes, minlength=len(STITCHES))
+
+    def row_histograms(self):
+        """Per-row stitch counts as a (num_rows, len(STITCHES)) array."""
+        flat = self.row_ids * len(STITCHES) + self.codes
+        return np.bincount(flat, minlength=self.num_rows * len(STITCHES)).reshape(self.num_rows, len(STITCHES))
+
+    def lean_balance(self):
+        """Per-row sum of stitch directions; negative leans left, positive right."""
+        return self._per_row(DIRECTION[self.codes])
+
+    def _with_codes(self, codes):
+        return ArrayChart(self.num_rows, self.starting_stitch_count, self.stitch_counts, codes, self.row_bounds)
+
+    def replace(self, old_stitch, new_stitch):
+        codes = self.codes.copy()
+        codes[codes == old_stitch.code()] = new_stitch.code()
+        return self._with_codes(codes)
+
+    def mirror(self):
+        """Reverse every row and swap each leaning stitch for its mirror image.
+
+        Only rows that fill exactly their own slots can be converted back to
+        a CircularChart afterwards; a row that wraps into the next one does
+        not fit once reversed.
+        """
+        starts = self.row_bounds[self.row_ids]
+        ends = self.row_bounds[self.row_ids + 1]
+        positions = np.arange(len(self.codes))
+        return self._with_codes(MIRROR[self.codes[starts + ends - 1 - positions]])
@@ -0,0 +1,58 @@
+from circular_chart import CircularChart
+from chart_cache import chart_key
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import blake2b
+import os
+import random
+
+def chart_seed(seed, index):
+    """Seed for chart number index of a batch, independent of how the batch is split."""
+    digest = blake2b(f"{seed}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+def generate_payload(num_rows, starting_stitch_count, seed, index):
+    chart = CircularChart(num_rows, starting_stitch_count)
+    chart.generate_random_chart(rng=random.Random(chart_seed(seed, index)))
+    return chart.to_payload()
+
+def _generate_chunk(num_rows, starting_stitch_count, seed, indices):
+    return [generate_payload(num_rows, starting_stitch_count, seed, index) for index in indices]
+
+def _generate_indices(num_rows, starting_stitch_count, seed, indices, workers, chunksize):
+    if workers <= 1 or len(indices) <= 1:
+        return _generate_chunk(num_rows, starting_stitch_count, seed, indices)
+    if chunksize is None:
+        # a few chunks per worker keeps the pool busy without per-chart IPC
+        chunksize = max(1, len(indices) // (workers * 4))
+    chunks = [indices[start:start + chunksize] for start in range(0, len(indices), chunksize)]
+    payloads = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in executor.map(_generate_chunk, [num_rows] * len(chunks),
+                                  [starting_stitch_count] * len(chunks),
+                                  [seed] * len(chunks), chunks):
+            payloads.extend(chunk)
+    return payloads
+
+def generate_many(num_rows, starting_stitch_count, count, seed=None, workers=None, chunksize=None, cache=None):
+    """Generate count random charts, returned in order as CircularChart payloads.
+
+    Every chart gets its own random.Random derived from seed and its index,
+    so the output for a given seed is identical for any number of workers.
+    Use CircularChart.from_payload to turn a payload back into a chart.
+    With a ChartCache, charts already in it are read back and only the
+    rest are generated (and then stored).
+    """
+    if seed is None:
+        seed = random.randrange(2**63)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if cache is None:
+        return _generate_indices(num_rows, starting_stitch_count, seed, range(count), workers, chunksize)
+    keys = [chart_key(num_rows, starting_stitch_count, chart_seed(seed, index)) for index in range(count)]
+    payloads = [cache.get(key) for key in keys]
+    missing = [index for index, payload in enumerate(payloads) if payload is None]
+    generated = _generate_indices(num_rows, starting_stitch_count, seed, missing, workers, chunksize)
+    for index, payload in zip(missing, generated):
+        cache.put(keys[index], payload)
+        payloads[index] = payload
+    return payloads
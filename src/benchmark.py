@@ -0,0 +1,179 @@
+"""Local benchmarks for chart construction, generation, row mutation and rendering.
+
+    python benchmark.py run --output baseline.json
+    python benchmark.py compare baseline.json --threshold 0.15
+
+compare runs the suite again (or reads --current) and exits non-zero when
+any case got slower than the baseline by more than the threshold.
+"""
+from circular_chart import CircularChart
+from completion import RowCompleter
+from constraint_table import ConstraintTable
+from rule_engine import RuleAutomaton
+from rules import (MaintainStitchCountRowRule, NoDoubleIncreasesFromThinAirRowRule,
+                   DoubleStitchCountIncreaseRowRule, NoIncreasesRowRule, NoDecreasesRowRule,
+                   NoCablesRowRule, row_rules)
+from stitch import StitchEnum
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+ROW_COUNTS = (4, 8, 12, 16, 20, 24)
+STARTING_STITCH_COUNTS = (4, 8, 16, 32, 64)
+QUICK_ROW_COUNTS = (4, 12)
+QUICK_STARTING_STITCH_COUNTS = (4, 16)
+RULE_CLASSES = (MaintainStitchCountRowRule, NoDoubleIncreasesFromThinAirRowRule,
+                DoubleStitchCountIncreaseRowRule, NoIncreasesRowRule, NoDecreasesRowRule,
+                NoCablesRowRule)
+
+def _generated_chart(num_rows, starting_stitch_count, seed=0):
+    chart = CircularChart(num_rows, starting_stitch_count)
+    chart.generate_random_chart(rng=random.Random(seed))
+    return chart
+
+def _widest_row(chart):
+    return chart[chart.num_rows - 1]
+
+def _rebuild_rules():
+    for rule in RULE_CLASSES:
+        rule.combos = None
+        rule.valid_stitch_combinations()
+    # tables and completers memoize per automaton, so they go with them;
+    # otherwise every loop would leave its automata reachable from them
+    RuleAutomaton._compiled.clear()
+    ConstraintTable._compiled.clear()
+    RowCompleter._cache.clear()
+    for rule in RULE_CLASSES:
+        RuleAutomaton.compile([rule])
+    for row_num, is_increase_row in ((0, False), (2, True), (4, False)):
+        RuleAutomaton.compile(row_rules(row_num, is_increase_row))
+
+# each case maps (num_rows, starting_stitch_count) to a (setup, run) pair;
+# only run() is timed
+def _case_init(num_rows, starting_stitch_count):
+    return None, lambda state: CircularChart(num_rows, starting_stitch_count)
+
+def _case_generate(num_rows, starting_stitch_count):
+    return None, lambda state: _generated_chart(num_rows, starting_stitch_count)
+
+def _case_row_setitem(num_rows, starting_stitch_count):
+    def setup():
+        return _widest_row(_generated_chart(num_rows, starting_stitch_count))
+    def run(row):
+        row[row.stitch_count // 2] = StitchEnum.PURL
+    return setup, run
+
+def _case_row_getitem(num_rows, starting_stitch_count):
+    def setup():
+        return _widest_row(_generated_chart(num_rows, starting_stitch_count))
+    return setup, lambda row: row[row.stitch_count // 2]
+
+def _case_print_string(num_rows, starting_stitch_count):
+    def setup():
+        return _generated_chart(num_rows, starting_stitch_count)
+    return setup, lambda chart: chart.chart_print_string()
+
+SIZED_CASES = {
+    "chart_init": _case_init,
+    "generate": _case_generate,
+    "row_setitem": _case_row_setitem,
+    "row_getitem": _case_row_getitem,
+    "print_chart_2_string": _case_print_string,
+}
+
+def _measure(setup, run, repeat, min_time):
+    state = setup() if setup is not None else None
+    # pick a loop count that makes one sample last at least min_time
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            run(state)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run(state)
+        samples.append((time.perf_counter() - start) / loops)
+    state = setup() if setup is not None else None
+    tracemalloc.start()
+    run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    samples.sort()
+    return {"best_s": samples[0], "median_s": samples[len(samples) // 2], "loops": loops,
+            "peak_bytes": peak}
+
+def run_suite(quick=False, repeat=5, min_time=0.05, out=sys.stderr):
+    row_counts = QUICK_ROW_COUNTS if quick else ROW_COUNTS
+    starting_counts = QUICK_STARTING_STITCH_COUNTS if quick else STARTING_STITCH_COUNTS
+    results = {}
+    for name, case in SIZED_CASES.items():
+        for num_rows in row_counts:
+            for starting_stitch_count in starting_counts:
+                key = f"{name}[rows={num_rows},sts={starting_stitch_count}]"
+                results[key] = _measure(*case(num_rows, starting_stitch_count), repeat, min_time)
+                out.write(f"{key}: {results[key]['best_s'] * 1e6:.1f}us, peak {results[key]['peak_bytes']}B\n")
+    results["rule_combinations"] = _measure(None, lambda state: _rebuild_rules(), repeat, min_time)
+    out.write(f"rule_combinations: {results['rule_combinations']['best_s'] * 1e6:.1f}us\n")
+    return {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+
+def compare(baseline, current, threshold):
+    """Cases whose best time grew by more than threshold (a fraction), as (name, old, new, ratio)."""
+    regressions = []
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        ratio = result["best_s"] / old["best_s"]
+        if ratio > 1 + threshold:
+            regressions.append((name, old["best_s"], result["best_s"], ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the suite and print or save the results")
+    compare_parser = commands.add_parser("compare", help="compare a run against a saved baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("--current", help="saved results to compare instead of a fresh run")
+    compare_parser.add_argument("--threshold", type=float, default=0.15,
+                                help="allowed slowdown as a fraction (default 0.15)")
+    for sub in (run_parser, compare_parser):
+        sub.add_argument("--output", help="write the results of this run as JSON")
+        sub.add_argument("--quick", action="store_true", help="only a few chart sizes")
+        sub.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "compare" and args.current:
+        with open(args.current) as file:
+            current = json.load(file)
+    else:
+        current = run_suite(quick=args.quick, repeat=args.repeat)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(current, file, indent=2, sort_keys=True)
+    if args.command == "run":
+        if not args.output:
+            json.dump(current, sys.stdout, indent=2, sort_keys=True)
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressions = compare(baseline, current, args.threshold)
+    for name, old, new, ratio in regressions:
+        print(f"REGRESSION {name}: {old * 1e6:.1f}us -> {new * 1e6:.1f}us ({ratio:.2f}x)")
+    if not regressions:
+        print(f"no regressions above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ from stitch import StitchEnum, Direction
 import random
 
 class StitchCoords:
+    __slots__ = ('row_num', 'stitch_num')
     def __init__(self, row_num, stitch_num):
         self.row_num = row_num
         self.stitch_num = stitch_num
@@ -10,7 +11,7 @@ class StitchCoords:
     def __str__(self):
         return f"(row {self.row_num}, stitch {self.stitch_num})"
     def __hash__(self):
-        return hash(self.row_num) ^ hash(self.stitch_num)
+        return hash((self.row_num, self.stitch_num))
     def __eq__(self, other):
         if other is None:
             return False
@@ -31,17 +32,13 @@ class StitchCoords:
         return chart.increment_coords(self)
 
 class LiveStitch:
-    def set_coords(self):
-        self.coords = []
-        coords = StitchCoords(self._row.row_num, self._start_index)
-        for i in range(self.stitch_enum.ending_size):
-            self.coords.append(coords)
-            coords = self._chart().increment_coords(self.coords[-1])
+    # coordinates are derived from the start index and the stitch's ending
+    # size on demand instead of being stored per stitch
+    __slots__ = ('stitch_enum', '_start_index', '_row')
     def __init__(self, stitch_enum, start_index, row):
         self.stitch_enum = stitch_enum
         self._start_index = start_index
         self._row = row
-        self.set_coords()
     def __repr__(self):
         return f"LiveStitch(stitch={repr(self.stitch_enum)},start_index={self._start_index},row={self._row})"
     def __str__(self):
@@ -76,9 +73,18 @@ class LiveStitch:
         return self._row._chart
     def name(self):
         return self.stitch_enum.name()
+    def start_offset(self):
+        return self._chart()._offset_of(self._row.row_num, self._start_index)
+    def span(self):
+        return self.stitch_enum.ending_size
     def start_coords(self):
-        return self.coords[0]
+        return StitchCoords(self._row.row_num, self._start_index)
     def all_coords(self):
-        return self.coords
+        # None for any slot past the end of the chart
+        coords = list(self._chart().coords_range(self.start_coords(), self.span()))
+        return coords + [None] * (self.span() - len(coords))
+    @property
+    def coords(self):
+        return self.all_coords()
     def end_coords(self):
-        return self.coords[-1]
+        return self._chart().advance(self.start_coords(), self.span() - 1)
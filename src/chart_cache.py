@@ -0,0 +1,191 @@
+"""Content-addressed on-disk cache of generated charts.
+
+A chart is stored under a hash of everything that determines it: the row
+schedule, the seed, the stitch catalogue, the adjacency-restricted stitches
+and the source of the modules that turn those into stitches. Entries are
+chart files (see chart_file.py) written to a temporary name and moved into
+place with os.replace, so concurrent workers sharing a directory never see
+a partial entry. The directory is kept under max_bytes by evicting the
+least recently used entries, by modification time, which a hit refreshes.
+An entry that cannot be read counts as a miss and is removed, and
+temporary files left behind by interrupted writes are removed when a cache
+is opened on the directory.
+"""
+from circular_chart import CircularChart
+from chart_file import ChartFile, write_rows
+from stitch import StitchEnum
+from functools import lru_cache
+from hashlib import blake2b
+import inspect
+import os
+import random
+import struct
+import tempfile
+import time
+
+import circular_chart
+import completion
+import constraint_table
+import rule_engine
+import rules
+import stitch
+
+_SUFFIX = ".chart"
+_TEMP_SUFFIX = ".tmp"
+# a temporary file this old belongs to a write that will never finish;
+# younger ones may be another process's write in progress
+_STALE_TEMP_SECONDS = 3600
+
+@lru_cache(maxsize=None)
+def generator_fingerprint():
+    """Hash of the stitch catalogue and of the code that generates charts from a seed."""
+    digest = blake2b(digest_size=16)
+    for stitch_enum in StitchEnum:
+        digest.update(repr((stitch_enum.name(), stitch_enum.starting_size, stitch_enum.ending_size,
+                            stitch_enum.direction.name)).encode())
+    for module in (stitch, rules, rule_engine, constraint_table, completion, circular_chart):
+        digest.update(inspect.getsource(module).encode())
+    return digest.hexdigest()
+
+def chart_key(num_rows, starting_stitch_count, seed, restricted_stitches=None):
+    if restricted_stitches is None:
+        restricted_stitches = CircularChart.stitches_that_may_not_appear_next_to_each_other
+    restricted = sorted(stitch_enum.code() for stitch_enum in restricted_stitches)
+    description = repr((num_rows, starting_stitch_count, seed, restricted, generator_fingerprint()))
+    return blake2b(description.encode(), digest_size=20).hexdigest()
+
+def generate_seeded(num_rows, starting_stitch_count, seed, restricted_stitches=None):
+    chart = CircularChart(num_rows, starting_stitch_count)
+    if restricted_stitches is not None:
+        chart.stitches_that_may_not_appear_next_to_each_other = set(restricted_stitches)
+    chart.generate_random_chart(rng=random.Random(seed))
+    return chart.to_payload()
+
+class ChartCache:
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.__sweep_temp_files()
+        self.__size = self.__scan_size()
+
+    def __repr__(self):
+        return f"ChartCache({self.directory!r}, hits={self.hits}, misses={self.misses})"
+
+    def __path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def __entries(self):
+        # (mtime, size, path) of every entry, oldest first
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(_SUFFIX):
+                    try:
+                        info = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((info.st_mtime_ns, info.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def __sweep_temp_files(self):
+        stale = time.time() - _STALE_TEMP_SECONDS
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(_TEMP_SUFFIX):
+                    try:
+                        if entry.stat().st_mtime < stale:
+                            os.unlink(entry.path)
+                    except FileNotFoundError:
+                        pass
+
+    def __scan_size(self):
+        return sum(size for _, size, _ in self.__entries())
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "bytes": self.__size}
+
+    def get(self, key):
+        """The cached payload for key, or None."""
+        path = self.__path(key)
+        try:
+            with ChartFile(path) as chart_file:
+                payload = chart_file.to_payload()
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (ValueError, struct.error):
+            # a corrupt or truncated entry; drop it so it is written afresh
+            self.__remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return payload
+
+    def put(self, key, payload):
+        num_rows, starting_stitch_count, rows = payload
+        path = self.__path(key)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=_TEMP_SUFFIX)
+        os.close(fd)
+        try:
+            write_rows(temp_path, num_rows, starting_stitch_count, rows)
+            size = os.path.getsize(temp_path)
+            try:
+                # an entry being overwritten stops counting towards the total
+                size -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.__size += size
+        if self.__size > self.max_bytes:
+            self.__evict()
+
+    def __remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+        except FileNotFoundError:
+            return
+        self.__size -= size
+
+    def __evict(self):
+        # other processes may share the directory, so recount before evicting
+        entries = self.__entries()
+        self.__size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.__size <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            self.__size -= size
+            self.evictions += 1
+
+    def generate(self, num_rows, starting_stitch_count, seed, restricted_stitches=None):
+        """Payload of the chart generate_random_chart makes with random.Random(seed), cached."""
+        key = chart_key(num_rows, starting_stitch_count, seed, restricted_stitches)
+        payload = self.get(key)
+        if payload is None:
+            payload = generate_seeded(num_rows, starting_stitch_count, seed, restricted_stitches)
+            self.put(key, payload)
+        return payload
+
+    def chart(self, num_rows, starting_stitch_count, seed, restricted_stitches=None):
+        return CircularChart.from_payload(self.generate(num_rows, starting_stitch_count, seed, restricted_stitches))
+
+    def clear(self):
+        for _, _, path in self.__entries():
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self.__size = 0
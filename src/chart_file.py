@@ -0,0 +1,154 @@
+"""Versioned binary chart files with memory-mapped random access.
+
+Layout (little-endian):
+
+    header      magic b"KPIC", u16 version, u16 stitch catalogue size,
+                u32 num_rows, u32 starting_stitch_count
+    row table   num_rows entries of (u32 stitch_count, u32 first slot,
+                u64 end of the row's codes in the data section)
+    data        one byte per stitch, its StitchEnum.code(), rows in order
+
+A row's first slot is where its first stitch starts; it is only non-zero
+when the previous row's last stitch wrapped into this one.
+"""
+from circular_chart import CircularChart, stitch_counts_for
+from stitch import StitchEnum
+import mmap
+import struct
+
+MAGIC = b"KPIC"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHII")
+_ROW_ENTRY = struct.Struct("<IIQ")
+
+def write_rows(path, num_rows, starting_stitch_count, rows):
+    """Write rows, an iterable of per-row stitch code bytes, as they arrive.
+
+    Accepts the rows of a CircularChart payload or the codes() of streamed
+    RowRecords; only one row is held at a time.
+    """
+    stitch_counts = stitch_counts_for(num_rows, starting_stitch_count)
+    entries = []
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, len(StitchEnum), num_rows, starting_stitch_count))
+        file.write(bytes(_ROW_ENTRY.size * num_rows))
+        end = 0
+        overflow = 0
+        for row_num, codes in enumerate(rows):
+            codes = bytes(codes)
+            file.write(codes)
+            end += len(codes)
+            entries.append(_ROW_ENTRY.pack(stitch_counts[row_num], overflow, end))
+            produced = overflow + sum(StitchEnum.from_code(code).ending_size for code in codes)
+            overflow = max(0, produced - stitch_counts[row_num])
+        assert len(entries) == num_rows, f"expected {num_rows} rows, got {len(entries)}"
+        file.seek(_HEADER.size)
+        file.write(b"".join(entries))
+
+def write_chart(chart, path):
+    num_rows, starting_stitch_count, rows = chart.to_payload()
+    write_rows(path, num_rows, starting_stitch_count, rows)
+
+class MappedRow:
+    """Read-only view of one row of a ChartFile, decoded on first use."""
+    def __init__(self, chart_file, row_num, stitch_count, first_slot, start, end):
+        self._chart_file = chart_file
+        self.row_num = row_num
+        self.stitch_count = stitch_count
+        self._first_slot = first_slot
+        self._start = start
+        self._end = end
+        self._stitches = None
+        self._owners = None
+    def __repr__(self):
+        return f"MappedRow(row_num={self.row_num},stitch_count={self.stitch_count})"
+    def __len__(self):
+        return self._end - self._start
+    def codes(self):
+        return self._chart_file._data(self._start, self._end)
+    def stitch_enums(self):
+        if self._stitches is None:
+            self._stitches = [StitchEnum.from_code(code) for code in self.codes()]
+        return self._stitches
+    def __getitem__(self, stitch_index):
+        # the stitch of this row covering slot stitch_index, like Row
+        if stitch_index < 0 or stitch_index >= self.stitch_count:
+            raise IndexError(f"Invalid stitch: {stitch_index} (only {self.stitch_count} available)")
+        if self._owners is None:
+            self._owners = [None] * self.stitch_count
+            slot = self._first_slot
+            for stitch_enum in self.stitch_enums():
+                for i in range(slot, min(slot + stitch_enum.ending_size, self.stitch_count)):
+                    self._owners[i] = stitch_enum
+                slot += stitch_enum.ending_size
+        return self._owners[stitch_index]
+    def stitches_print_string(self):
+        return " ".join(str(stitch_enum) for stitch_enum in self.stitch_enums())
+    def is_empty(self):
+        return self._end == self._start
+
+class ChartFile:
+    """A chart file opened with mmap; rows are read only when accessed."""
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = None
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self._map) < _HEADER.size:
+                raise ValueError(f"{path} is too short to be a chart file")
+            magic, version, catalogue_size, self.num_rows, self.starting_stitch_count = \
+                _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a chart file")
+            if version != VERSION:
+                raise ValueError(f"{path} has unsupported chart file version {version}")
+            if catalogue_size > len(StitchEnum):
+                raise ValueError(f"{path} uses {catalogue_size} stitch codes, only {len(StitchEnum)} are known")
+            self._data_start = _HEADER.size + _ROW_ENTRY.size * self.num_rows
+            if len(self._map) < self._data_start or \
+                    (self.num_rows and len(self._map) < self._data_start + self._entry(self.num_rows - 1)[2]):
+                raise ValueError(f"{path} is too short for its {self.num_rows} rows")
+        except BaseException:
+            if self._map is not None:
+                self._map.close()
+            self._file.close()
+            raise
+        self._rows = {}
+    def __repr__(self):
+        return f"ChartFile(num_rows={self.num_rows},starting_stitch_count={self.starting_stitch_count})"
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+    def close(self):
+        self._rows = {}
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+    def __len__(self):
+        return self.num_rows
+    def _entry(self, row_num):
+        return _ROW_ENTRY.unpack_from(self._map, _HEADER.size + _ROW_ENTRY.size * row_num)
+    def _data(self, start, end):
+        return self._map[self._data_start + start:self._data_start + end]
+    def __getitem__(self, row_num):
+        # like CircularChart: None past the last row
+        if row_num < 0:
+            row_num += self.num_rows
+        if row_num < 0 or row_num >= self.num_rows:
+            return None
+        if row_num not in self._rows:
+            stitch_count, first_slot, end = self._entry(row_num)
+            start = self._entry(row_num - 1)[2] if row_num > 0 else 0
+            self._rows[row_num] = MappedRow(self, row_num, stitch_count, first_slot, start, end)
+        return self._rows[row_num]
+    def chart_print_string(self):
+        max_pad_size = len(str(self.num_rows + 1))
+        return "\n".join(f"Row {str(row_num + 1).zfill(max_pad_size)} ({self[row_num].stitch_count}sts): "
+                         f"{self[row_num].stitches_print_string()}"
+                         for row_num in range(self.num_rows - 1, -1, -1))
+    def to_payload(self):
+        return (self.num_rows, self.starting_stitch_count,
+                tuple(self[row_num].codes() for row_num in range(self.num_rows)))
+    def to_chart(self):
+        return CircularChart.from_payload(self.to_payload())
@@ -1,8 +1,87 @@
 from row import Row
 from chart import StitchCoords
-from stitch import StitchEnum, Direction
+from stitch import StitchEnum
+from constraint_table import ConstraintTable, RowKind
+from events import EventKind, GenerationEvent, ChangeSet
+from rules import row_rules
+from rule_engine import RuleAutomaton
+from completion import RowCompleter
+from stats import ChartStats
+from lineage import LineageIndex
+import profiling
+from bisect import bisect_right
+from itertools import accumulate
+from weakref import WeakSet
 import random
 
+def stitch_counts_for(num_rows, starting_stitch_count):
+  # how many stitches each row needs: the count doubles after 2 rows, then
+  # after 4 more, then 8 more, and so on
+  stitch_counts_per_row = []
+  current_stitch_count = starting_stitch_count
+  num_rows_at_current_stitch_count = 2
+  while len(stitch_counts_per_row) < num_rows:
+    num_rows_to_append = min(num_rows-len(stitch_counts_per_row),num_rows_at_current_stitch_count)
+    stitch_counts_per_row.extend([current_stitch_count] * num_rows_to_append)
+    current_stitch_count = current_stitch_count * 2
+    num_rows_at_current_stitch_count = num_rows_at_current_stitch_count * 2
+  return stitch_counts_per_row
+
+def row_starts_for(stitch_counts):
+  # offset of the first stitch of each row, plus the total at the end
+  return list(accumulate(stitch_counts, initial=0))
+
+def row_completer(stitch_counts, row_num, table):
+  # the RowCompleter that generates row row_num of a chart with this schedule
+  is_increase_row = row_num != 0 and stitch_counts[row_num] > stitch_counts[row_num - 1]
+  if row_num == 0:
+    row_kind = RowKind.FIRST
+  elif is_increase_row:
+    row_kind = RowKind.INCREASE
+  else:
+    row_kind = RowKind.PLAIN
+  automaton = RuleAutomaton.compile(row_rules(row_num, is_increase_row))
+  return RowCompleter.for_row(table, row_kind, automaton)
+
+def coords_at_in(row_starts, offset):
+  # the coords of a chart offset, or None outside the chart
+  if offset < 0 or offset >= row_starts[-1]:
+    return None
+  row_num = bisect_right(row_starts, offset) - 1
+  return StitchCoords(row_num, offset - row_starts[row_num])
+
+def advance_in(row_starts, coords, n):
+  # coords moved n stitches along the chart, crossing rows as needed, or
+  # None past either end
+  stitch_num = coords.stitch_num + n
+  if 0 <= stitch_num < row_starts[coords.row_num + 1] - row_starts[coords.row_num]:
+    return StitchCoords(coords.row_num, stitch_num)
+  return coords_at_in(row_starts, row_starts[coords.row_num] + stitch_num)
+
+def next_coords_in(stitch_counts, coords):
+  # increment_coords for a bare row schedule
+  assert coords is not None, "cannot step past the end of the chart"
+  assert coords.stitch_num < stitch_counts[coords.row_num], \
+  f"invalid coords: {coords} for a row of {stitch_counts[coords.row_num]} stitches"
+  if coords.stitch_num + 1 < stitch_counts[coords.row_num]:
+    return StitchCoords(coords.row_num, coords.stitch_num + 1)
+  elif coords.row_num + 1 < len(stitch_counts):
+    return StitchCoords(coords.row_num + 1, 0)
+  else:
+    return None
+
+class ChartSnapshot:
+  """The contents of a CircularChart at one point; see CircularChart.snapshot."""
+  __slots__ = ('num_rows', 'starting_stitch_count', 'row_states', 'row_rules')
+  def __init__(self, num_rows, starting_stitch_count, row_states, row_rules):
+    self.num_rows = num_rows
+    self.starting_stitch_count = starting_stitch_count
+    self.row_states = row_states
+    self.row_rules = row_rules
+
+  def __repr__(self):
+    return f"ChartSnapshot(num_rows={self.num_rows},starting_stitch_count={self.starting_stitch_count})"
+
 class CircularChart:
   stitches_that_may_not_appear_next_to_each_other = {StitchEnum.YO,
                                                      StitchEnum.M1R,
@@ -10,20 +89,29 @@ class CircularChart:
                                                      StitchEnum.RLI,
                                                      StitchEnum.LLI}
 
-  def __init__(self, num_rows, starting_stitch_count):
+  def __init__(self, num_rows, starting_stitch_count, snapshot=None):
+    # with a snapshot, the rows start out sharing its contents (see fork)
+    assert snapshot is None or (snapshot.num_rows, snapshot.starting_stitch_count) == \
+    (num_rows, starting_stitch_count), "snapshot is of a differently shaped chart"
+    self.num_rows = num_rows
+    self.starting_stitch_count = starting_stitch_count
     self.__chart_array = []
+    self._change_sets = WeakSet()
+    self._lineage = None
+    # number of each stitch in the whole chart, indexed by stitch code and
+    # kept up to date by Row.__setitem__ (see stats.ChartStats)
+    self._stitch_totals = [0] * len(StitchEnum)
     # build the internal data for how many stitches each row needs
-    stitch_counts_per_row = []
-    current_stitch_count = starting_stitch_count
-    num_rows_at_current_stitch_count = 2
-    while len(stitch_counts_per_row) < num_rows:
-      num_rows_to_append = min(num_rows-len(stitch_counts_per_row),num_rows_at_current_stitch_count)
-      stitch_counts_per_row.extend([current_stitch_count] * num_rows_to_append)
-      current_stitch_count = current_stitch_count * 2
-      num_rows_at_current_stitch_count = num_rows_at_current_stitch_count * 2
-    # print(stitch_counts_per_row)
+    stitch_counts_per_row = stitch_counts_for(num_rows, starting_stitch_count)
+    self._stitch_counts = stitch_counts_per_row
+    # global offset of the first stitch of each row, plus the total at the end
+    self._row_starts = row_starts_for(stitch_counts_per_row)
     for i, stitch_count in enumerate(stitch_counts_per_row):
-      self.__chart_array.append(Row(i,stitch_count,chart=self))
+      if snapshot is None:
+        self.__chart_array.append(Row(i,stitch_count,chart=self))
+      else:
+        self.__chart_array.append(Row(i,stitch_count,chart=self,state=snapshot.row_states[i],rules=snapshot.row_rules[i]))
+        self.__count_row(snapshot.row_states[i].counts, 1)
     # print(self.__chart_array)
     # print(self.is_empty())
 
@@ -35,13 +123,21 @@ class CircularChart:
       row_string = row_string + str([s.name() for s in self.__chart_array[ri]])
       print(row_string)
 
-  def print_chart_2(self):
+  def row_print_string(self, row_num):
     max_pad_size = len(str(len(self.__chart_array)+1))
+    row_str = "Row " + str(row_num+1).zfill(max_pad_size)
+    row_str = row_str + " (" + str(self.__chart_array[row_num].stitch_count) + "sts): "
+    return row_str + self[row_num].stitches_print_string()
+
+  def chart_print_string(self):
+    lines = []
     for row_num in range(len(self.__chart_array)-1,-1,-1):
-      row_str = "Row " + str(row_num+1).zfill(max_pad_size)
-      row_str = row_str + " (" + str(self.__chart_array[row_num].stitch_count) + "sts): "
-      row_str = row_str + self[row_num].stitches_print_string()
-      print(row_str)
+      lines.append(self.row_print_string(row_num))
+    return "\n".join(lines)
+
+  def print_chart_2(self):
+    if len(self.__chart_array) > 0:
+      print(self.chart_print_string())
 
   def is_empty(self):
     return all(row.is_empty() for row in self.__chart_array)
@@ -51,216 +147,228 @@ class CircularChart:
       return self.__chart_array[row_num]
     return None
 
+  def snapshot(self):
+    # rows are shared with the snapshot and copied on their next write, so
+    # this costs one reference per row whatever the chart's size
+    return ChartSnapshot(self.num_rows, self.starting_stitch_count,
+                         tuple(row._state() for row in self.__chart_array),
+                         tuple(row.rules() for row in self.__chart_array))
+
+  def restore(self, snapshot):
+    assert (snapshot.num_rows, snapshot.starting_stitch_count) == (self.num_rows, self.starting_stitch_count), \
+    "snapshot is of a differently shaped chart"
+    for row, state, rules in zip(self.__chart_array, snapshot.row_states, snapshot.row_rules):
+      if row._state() is not state:
+        self.__count_row(row.stitch_counts(), -1)
+        row._set_state(state, rules)
+        self.__count_row(state.counts, 1)
+        self._mark_dirty(row.row_num, 0, row.stitch_count)
+
+  def __count_row(self, counts, sign):
+    for code, count in enumerate(counts):
+      self._stitch_totals[code] += sign * count
+
+  def lineage(self):
+    # created on first use; from then on it follows every edit
+    if self._lineage is None:
+      self._lineage = LineageIndex(self)
+    return self._lineage
+
+  def stats(self, yarn_weights=None):
+    return ChartStats(self, yarn_weights)
+
+  def fork(self):
+    # an independent chart with the same stitches; rows are copied lazily
+    return CircularChart(self.num_rows, self.starting_stitch_count, self.snapshot())
+
+  def track_changes(self):
+    # a ChangeSet that collects every edit from now on; it stops being
+    # updated once the caller drops it
+    changes = ChangeSet()
+    self._change_sets.add(changes)
+    return changes
+
+  def _mark_dirty(self, row_num, start, end):
+    # slots start..end of row_num changed. slots past the end of the row
+    # spill into the next one, the way advance walks them
+    if not self._change_sets:
+      return
+    first = self._offset_of(row_num, start)
+    last = min(self._offset_of(row_num, end), self._row_starts[-1])
+    while first < last:
+      coords = self.from_offset(first)
+      row_end = min(self._row_starts[coords.row_num + 1], last)
+      slots = range(coords.stitch_num, coords.stitch_num + row_end - first)
+      for changes in self._change_sets:
+        changes.add(coords.row_num, slots)
+      first = row_end
+
   def increment_coords(self,coords):
-    row = self[coords.row_num]
-    assert coords.stitch_num < row.stitch_count, \
-    f"invalid coords: {coords} for row: {row}"
-    if coords.stitch_num + 1 < row.stitch_count:
-      return StitchCoords(coords.row_num, coords.stitch_num + 1)
-    elif self[coords.row_num + 1] != None:
-      return StitchCoords(coords.row_num + 1, 0)
-    else:
-      return None
+    return next_coords_in(self._stitch_counts, coords)
+
+  def advance(self, coords, n=1):
+    # O(1) within a row, O(log rows) across rows
+    return advance_in(self._row_starts, coords, n)
+
+  def to_offset(self, coords):
+    return self._row_starts[coords.row_num] + coords.stitch_num
+
+  def from_offset(self, offset):
+    return coords_at_in(self._row_starts, offset)
+
+  def coords_range(self, start, count):
+    # the coords of count stitches from start on, stopping at the end of the chart
+    row_num, stitch_num = start.row_num, start.stitch_num
+    while count > 0 and row_num < self.num_rows:
+      row_end = min(self._stitch_counts[row_num], stitch_num + count)
+      for i in range(stitch_num, row_end):
+        yield StitchCoords(row_num, i)
+      count -= row_end - stitch_num
+      row_num, stitch_num = row_num + 1, 0
+
+  def to_payload(self):
+    # compact, picklable form: one byte string of stitch codes per row. the
+    # stitches must be laid down contiguously from the first slot, which is
+    # how generate_random_chart fills a chart; a chart with gaps cannot be
+    # written this way, so it fails rather than losing the gaps
+    rows = []
+    offset = 0
+    for row in self.__chart_array:
+      codes = bytearray()
+      for stitch in row.stitches():
+        assert self._row_starts[row.row_num] + stitch._start_index == offset, \
+        f"cannot make a payload of a chart with a gap before {stitch.start_coords()}"
+        codes.append(stitch.stitch_enum.code())
+        offset += stitch.stitch_enum.ending_size
+      rows.append(bytes(codes))
+    return (self.num_rows, self.starting_stitch_count, tuple(rows))
+
+  @classmethod
+  def from_payload(cls, payload):
+    num_rows, starting_stitch_count, rows = payload
+    chart = cls(num_rows, starting_stitch_count)
+    offset = 0
+    for row_num, codes in enumerate(rows):
+      for code in codes:
+        stitch_enum = StitchEnum.from_code(code)
+        coords = chart.from_offset(offset)
+        assert coords is not None and coords.row_num == row_num, \
+        f"payload row {row_num} does not fit the chart at {coords}"
+        chart[row_num][coords.stitch_num] = stitch_enum
+        offset += stitch_enum.ending_size
+    return chart
+
+  def _offset_of(self, row_num, stitch_num):
+    return self._row_starts[row_num] + stitch_num
 
   def final_coords(self):
-    return self[-1].end_coords()
+    return self.from_offset(self._row_starts[-1] - 1)
 
   def final_coords_for_stitch_starting_at(self, new_stitch, start_coords):
-    next_coords = start_coords
-    for i in range(new_stitch.starting_size - 1):
-      self.increment_coords(next_coords)
+    # the last slot a stitch placed at start_coords covers, which may be in
+    # a later row; None if it runs off the end of the chart
+    return self.advance(start_coords, new_stitch.ending_size - 1)
 
-  def generate_random_chart(self):
+  def generate_random_chart(self, events=None, rng=random):
+    # events is an optional sink (any callable, e.g. an EventRing) that
+    # receives a GenerationEvent for every placement and finished row;
+    # rng is anything with the random.Random interface
     assert self.is_empty(), "cannot generate a random chart -- it is not empty"
-    current = StitchCoords(0, 0)
+    table = ConstraintTable.compile(self.stitches_that_may_not_appear_next_to_each_other)
+    for coords, stitch_enum in CircularChart.random_placements(self._stitch_counts, table, rng, events):
+      self[coords.row_num][coords.stitch_num] = stitch_enum
+      if events is not None:
+        events(GenerationEvent(EventKind.STITCH_PLACED, coords, stitch_enum))
+
+  @staticmethod
+  def random_placements(stitch_counts, table, rng=random, events=None, seam_safe=False,
+                        start_row=0, stop_row=None, start_restricted=False):
+    # yields (coords, stitch) for a random chart with the given row schedule,
+    # in placement order. rows are built from stitch groups that keep the
+    # row balanced (see ConstraintTable.template), satisfy the row's rules
+    # and fill it exactly, so generation cannot dead-end. with seam_safe,
+    # every row starts as if after a restricted stitch, so its first stitch
+    # may follow any stitch at all (see WedgeChart); start_restricted does
+    # the same for just the first row, when generating rows start_row to
+    # stop_row on their own (see segmented.py)
+    if stop_row is None:
+      stop_row = len(stitch_counts)
+    current = StitchCoords(start_row, 0)
+    row_starts = row_starts_for(stitch_counts)
     previous_stitch = None
-    while current != None:
-      print("generating at " + str(current))
-      current_row = self[current.row_num]
-
-      is_increase_row = current.row_num != 0 and \
-      current_row.stitch_count > current_row.previous_row().stitch_count
-      print(is_increase_row)
-
-      # what stitches are allowed on this row?
-      if current_row.row_num == 0:
-        allowed_stitches = [st for st in list(StitchEnum) if
-                            st.starting_size == 1 and st.ending_size == 1]
-      elif is_increase_row:
-        allowed_stitches = [st for st in list(StitchEnum) if
-                            st.starting_size < 2]
-      else:
-        allowed_stitches = list(StitchEnum)
-
-      # increase limitations
-      if previous_stitch in CircularChart.stitches_that_may_not_appear_next_to_each_other:
-        allowed_stitches = [st for st in allowed_stitches if st not in \
-                            CircularChart.stitches_that_may_not_appear_next_to_each_other]
-        allowed_stitches = [st for st in allowed_stitches if st.direction !=
-                            Direction.LEFT and st not in
-                            {StitchEnum.CDD, StitchEnum.S2KP}]
-
-      # eliminate all directional 3->1 decreases, it's too hard to fill the \
-      # remaining 2 slots at random; also eliminate increases of +2 or more
-      allowed_stitches = [st for st in allowed_stitches if st.starting_size
-                          != 3 or st in {StitchEnum.CDD, StitchEnum.S2KP}]
-      allowed_stitches = [st for st in allowed_stitches if st.increased_stitch_count() < 2]
-      print("allowed stitches: " + str(allowed_stitches))
-
-      # generate a stitch
-      new_stitch = random.choice(allowed_stitches)
-      print("generated " + str(new_stitch))
-
-      if current_row == self[-1]:
-        total_retries = 0
-        stitch_requires_more_stitches_below_than_may_exist = \
-         (current.stitch_num + new_stitch.starting_size) > \
-         current_row.stitch_count
-        stitch_will_extend_the_number_of_stitches_on_the_final_row = \
-         (current.stitch_num + new_stitch.ending_size) > \
-         current_row.stitch_count
-        stitch_is_m1_increase_on_final_row = (current.stitch_num + 1) == \
-        current_row.stitch_count and new_stitch.starting_size == 0
-        while (total_retries < 10 and (stitch_requires_more_stitches_below_than_may_exist or
-               stitch_will_extend_the_number_of_stitches_on_the_final_row or
-               stitch_is_m1_increase_on_final_row)):
-          total_retries += 1
-          new_stitch = random.choice(allowed_stitches)
-          print("generated " + str(new_stitch))
-          stitch_requires_more_stitches_below_than_may_exist = \
-           (current.stitch_num + new_stitch.starting_size) > \
-           current_row.stitch_count
-          stitch_will_extend_the_number_of_stitches_on_the_final_row = \
-           (current.stitch_num + new_stitch.ending_size) > \
-           current_row.stitch_count
-          stitch_is_m1_increase_on_final_row = (current.stitch_num + 1) == \
-           current_row.stitch_count and new_stitch.starting_size == 0
-        assert total_retries < 10, "whoops infinite recursion"
-
-
-      # increase row? if 0->1 increase, add 1->1 stitch first. kfb/pfb are fine.
-      if is_increase_row:
-        print("increase row!")
-        assert new_stitch.starting_size == 0 or new_stitch.is_increase() or \
-         (new_stitch.starting_size == 1 and new_stitch.ending_size == 1), \
-         f"messed up the allowed stitches for increase rows somehow (trying to \
-         add {new_stitch})"
-        if new_stitch.starting_size == 0:
-          initial_stitch = random.choice([st for st in list(StitchEnum) if \
-                                          st.starting_size == 1 and \
-                                          st.ending_size == 1])
-          self[current.row_num][current.stitch_num] = initial_stitch
-          for i in range(initial_stitch.ending_size):
-            current = self.increment_coords(current)
-          self[current.row_num][current.stitch_num] = new_stitch
-          previous_stitch = new_stitch
-        elif new_stitch.is_increase():
-          # by definition 1->2 -- insert as-is
-          self[current.row_num][current.stitch_num] = new_stitch
-          previous_stitch = new_stitch
-        else:
-          # by definition 1->1 -- need to add a 0->1 increase
-          next_stitch = random.choice([st for st in list(StitchEnum) if \
-                                       st.starting_size == 0])
-          self[current.row_num][current.stitch_num] = new_stitch
-          for i in range(new_stitch.ending_size):
-            current = self.increment_coords(current)
-          self[current.row_num][current.stitch_num] = next_stitch
-          previous_stitch = next_stitch
-      elif new_stitch.is_increase():
-        # increase on non-increase row. need correspodning decrease
-        print("increase on non-increase row")
-        if new_stitch.direction == Direction.STRAIGHT:
-          # pick a decrease at random and follow the directionality rules
-          other_stitch = random.choice([st for st in list(StitchEnum) if \
-                                        st.starting_size == 2 and \
-                                        st.is_decrease()])
-          if other_stitch.direction == Direction.LEFT:
-            self[current.row_num][current.stitch_num] = new_stitch
-            for i in range(new_stitch.ending_size):
-              current = self.increment_coords(current)
-            self[current.row_num][current.stitch_num] = other_stitch
-            previous_stitch = other_stitch
-          else:
-            self[current.row_num][current.stitch_num] = other_stitch
-            for i in range(other_stitch.ending_size):
-              current = self.increment_coords(current)
-            self[current.row_num][current.stitch_num] = new_stitch
-            previous_stitch = new_stitch
-        elif new_stitch.direction == Direction.LEFT:
-          initial_stitch = random.choice([st for st in list(StitchEnum) if \
-                                          st.starting_size == 2 and \
-                                          st.is_decrease() and \
-                                          st.direction == Direction.RIGHT])
-          self[current.row_num][current.stitch_num] = initial_stitch
-          for i in range(initial_stitch.ending_size):
-            current = self.increment_coords(current)
-          self[current.row_num][current.stitch_num] = new_stitch
-          previous_stitch = new_stitch
-        else:
-          # must be RIGHT
-          final_stitch = random.choice([st for st in list(StitchEnum) if \
-                                        st.starting_size == 2 and \
-                                        st.is_decrease() and \
-                                        st.direction == Direction.LEFT])
-          self[current.row_num][current.stitch_num] = new_stitch
-          for i in range(new_stitch.ending_size):
-            current = self.increment_coords(current)
-          self[current.row_num][current.stitch_num] = final_stitch
-          previous_stitch = final_stitch
-      elif new_stitch.is_decrease():
-        if new_stitch.starting_size == 3:
-          print("CDD!")
-          # must be CDD. need increase before AND after
-          assert previous_stitch not in CircularChart.stitches_that_may_not_appear_next_to_each_other, \
-          f"whoops somehow we still got {previous_stitch} before CDD"
-          initial_stitch = random.choice([st for st in list(StitchEnum) if \
-                                          st.starting_size == 0 and \
-                                          st.direction != Direction.LEFT])
-          final_stitch = random.choice([st for st in list(StitchEnum) if \
-                                        st.starting_size == 0 and st.direction \
-                                        != Direction.RIGHT])
-          self[current.row_num][current.stitch_num] = initial_stitch
-          for i in range(initial_stitch.ending_size):
-            current = self.increment_coords(current)
-          self[current.row_num][current.stitch_num] = new_stitch
-          for i in range(new_stitch.ending_size):
-            current = self.increment_coords(current)
-          self[current.row_num][current.stitch_num] = final_stitch
-          previous_stitch = final_stitch
-        else:
-          # must be 2->1; find appropriate before/after increase
-          print("2->1!")
-          if new_stitch.direction == Direction.LEFT:
-            initial_stitch = random.choice([st for st in list(StitchEnum) if \
-                                            st.starting_size == 0 and \
-                                            st.direction != Direction.LEFT])
-            self[current.row_num][current.stitch_num] = initial_stitch
-            for i in range(initial_stitch.ending_size):
-              current = self.increment_coords(current)
-            self[current.row_num][current.stitch_num] = new_stitch
-            previous_stitch = new_stitch
-          else:
-            # must lean right
-            final_stitch = random.choice([st for st in list(StitchEnum) if \
-                                          st.starting_size == 0 and \
-                                          st.direction != Direction.RIGHT])
-            self[current.row_num][current.stitch_num] = new_stitch
-            for i in range(new_stitch.ending_size):
-              current = self.increment_coords(current)
-            self[current.row_num][current.stitch_num] = final_stitch
-            previous_stitch = final_stitch
-      else:
-        # new stitch is neither on an increase row nor a decrease -- just
-        # insert it as is.
-        self[current.row_num][current.stitch_num] = new_stitch
-        previous_stitch = new_stitch
-      print(previous_stitch)
-      print("generated through " + str(current))
-      current_row.print_stitches()
-      if self[current.row_num] != current_row:
-        self[current.row_num].print_stitches()
-      for i in range(previous_stitch.ending_size):
-        current = self.increment_coords(current)
-      print("new coords " + str(current))
-      print("")
+    while current != None and current.row_num < stop_row:
+      row_num = current.row_num
+      stitch_count = stitch_counts[row_num]
+
+      if current.stitch_num == 0:
+        completer = row_completer(stitch_counts, row_num, table)
+        automaton = completer.automaton
+        state = automaton.start
+        if profiling.active is not None:
+          profiling.count("generation.rows")
+
+      # draw the next group uniformly among the ways to finish the row
+      previous_restricted = previous_stitch in table.restricted_stitches or \
+      (seam_safe and current.stitch_num == 0) or (start_restricted and previous_stitch is None)
+      group = completer.sample(rng, stitch_count - current.stitch_num, (previous_restricted, state))
+      if profiling.active is not None:
+        profiling.count("generation.groups")
+        profiling.count("generation.stitches", len(group))
+
+      for stitch_enum in group:
+        yield current, stitch_enum
+        state = automaton.step(state, stitch_enum)
+        current = advance_in(row_starts, current, stitch_enum.ending_size)
+        previous_stitch = stitch_enum
+
+      if current is None or current.row_num != row_num:
+        assert automaton.is_accepting(state), f"row {row_num} ended without satisfying its rules"
+        if events is not None:
+          events(GenerationEvent(EventKind.ROW_COMPLETED, row_num=row_num))
+
+
+class ChartTextView:
+  """chart_print_string() for a chart being edited in place.
+
+  Keeps one line per row and rebuilds only the rows edited since the last
+  render, so redrawing after a single edit does not walk the whole chart.
+  The joined text is kept too: render() returns it as is when nothing
+  changed, and otherwise splices in just the span of rows that did.
+  """
+  def __init__(self, chart):
+    self.chart = chart
+    self.__changes = chart.track_changes()
+    self.__lines = [None] * chart.num_rows
+    for row_num in range(chart.num_rows):
+      self.__changes.add(row_num, ())
+    self.__text = None
+    # line lengths as of __text, and the rows rebuilt since
+    self.__lengths = None
+    self.__stale = set()
+
+  def render_rows(self):
+    # {row_num: line} for just the rows rebuilt by this call
+    rebuilt = {}
+    for row_num in self.__changes.take():
+      rebuilt[row_num] = self.__lines[row_num] = self.chart.row_print_string(row_num)
+    self.__stale.update(rebuilt)
+    return rebuilt
+
+  def render(self):
+    self.render_rows()
+    if self.__text is None:
+      self.__text = "\n".join(reversed(self.__lines))
+    elif self.__stale:
+      # rows are printed top row first, so the span runs from the highest
+      # stale row down to the lowest
+      top, bottom = max(self.__stale), min(self.__stale)
+      start = sum(self.__lengths[row_num] + 1 for row_num in range(top + 1, len(self.__lines)))
+      end = start + sum(self.__lengths[row_num] + 1 for row_num in range(bottom, top + 1)) - 1
+      span = "\n".join(self.__lines[row_num] for row_num in range(top, bottom - 1, -1))
+      self.__text = self.__text[:start] + span + self.__text[end:]
+    self.__lengths = [len(line) for line in self.__lines]
+    self.__stale.clear()
+    return self.__text
+
+# the hot modules are all loaded now, so KNITTING_PI_PROFILE can wrap them
+profiling.activate_from_environment()
@@ -0,0 +1,137 @@
+from math import exp, inf, log
+import profiling
+
+def _log_sum(log_values):
+    log_values = [value for value in log_values if value != -inf]
+    if not log_values:
+        return -inf
+    peak = max(log_values)
+    return peak + log(sum(exp(value - peak) for value in log_values))
+
+class RowCompleter:
+    """Samples the rest of a row uniformly among all the ways to finish it.
+
+    A state is (previous stitch is restricted, rule automaton state). For
+    every amount of room left, the completer memoizes how many sequences of
+    stitch groups fill that room exactly and leave the automaton accepting,
+    then draws each group in proportion to the completions behind it.
+    With weights in the table, a completion counts as the product of its
+    groups' weights (ConstraintTable.group_weight) instead of 1.
+    Counts are kept as logarithms because they grow exponentially with the
+    row length. One completer is shared by every row with the same kind and
+    rules, and its tables only grow, so each row costs O(row) once warm.
+    """
+    _cache = {}
+
+    @classmethod
+    def for_row(cls, table, row_kind, automaton):
+        key = (table, row_kind, automaton)
+        if key not in cls._cache:
+            cls._cache[key] = cls(table, row_kind, automaton)
+        return cls._cache[key]
+
+    def __init__(self, table, row_kind, automaton):
+        self.table = table
+        self.row_kind = row_kind
+        self.automaton = automaton
+        self._moves = {}
+        # every state a row can pass through, starting from either kind of
+        # previous stitch
+        self._states = []
+        pending = [(previous_restricted, automaton.start) for previous_restricted in (False, True)
+                   if automaton.start is not None]
+        seen = set(pending)
+        while pending:
+            state = pending.pop()
+            self._states.append(state)
+            for _, next_state, _, _, _ in self._moves_from(state):
+                if next_state not in seen:
+                    seen.add(next_state)
+                    pending.append(next_state)
+        # _log_counts[room][state] is the log of the number of completions
+        self._log_counts = [{state: 0.0 if automaton.is_accepting(state[1]) else -inf
+                             for state in self._states}]
+        # value -> per room, the best total of value over completions
+        self._best = {}
+
+    def _moves_from(self, state):
+        # [(width, next state, groups, group weights, log of their total)],
+        # grouping the distinct stitch groups that lead to the same place;
+        # the weights are None when the table has none
+        if state not in self._moves:
+            if profiling.active is not None:
+                profiling.count("completion.move_tables_built")
+            previous_restricted, automaton_state = state
+            buckets = {}
+            seen = set()
+            for stitch in self.table.allowed_after(self.row_kind, previous_restricted).stitches:
+                template = self.table.template(self.row_kind, stitch)
+                for _, group in self.table.viable_groups(template, self.automaton, automaton_state):
+                    if group in seen:
+                        continue
+                    seen.add(group)
+                    next_state = (group[-1] in self.table.restricted_stitches,
+                                  self.automaton.run(group, automaton_state))
+                    buckets.setdefault((template.width, next_state), []).append(group)
+            moves = []
+            for (width, next_state), groups in buckets.items():
+                if self.table.weights is None:
+                    moves.append((width, next_state, tuple(groups), None, log(len(groups))))
+                else:
+                    weights = tuple(self.table.group_weight(group) for group in groups)
+                    total = sum(weights)
+                    moves.append((width, next_state, tuple(groups), weights, log(total) if total > 0 else -inf))
+            self._moves[state] = moves
+        return self._moves[state]
+
+    def _extend(self, room):
+        for size in range(len(self._log_counts), room + 1):
+            self._log_counts.append({state: _log_sum(log_weight + self._log_counts[size - width][next_state]
+                                                     for width, next_state, _, _, log_weight
+                                                     in self._moves_from(state) if width <= size)
+                                     for state in self._states})
+
+    def log_completions(self, room, state):
+        if state not in self._log_counts[0]:
+            return -inf
+        self._extend(room)
+        return self._log_counts[room][state]
+
+    def best_total(self, room, state, value):
+        """Largest total of value(group) over the ways to fill room slots from state, or -inf if none.
+
+        value is a function of a stitch group; it is used as a key for the
+        table built here, so it must be hashable and stable across calls.
+        """
+        if state not in self._log_counts[0]:
+            return -inf
+        if value not in self._best:
+            self._best[value] = [{state: 0 if self.automaton.is_accepting(state[1]) else -inf
+                                  for state in self._states}]
+        best = self._best[value]
+        for size in range(len(best), room + 1):
+            best.append({state: max((max(value(group) for group in groups) + best[size - width][next_state]
+                                     for width, next_state, groups, _, _ in self._moves_from(state)
+                                     if width <= size), default=-inf)
+                         for state in self._states})
+        return best[room][state]
+
+    def sample(self, rng, room, state):
+        """Next stitch group for a row with room slots left, from state."""
+        total = self.log_completions(room, state)
+        assert total != -inf, f"no way to fill the remaining {room} stitches under the row's rules"
+        target = rng.random()
+        cumulative = 0.0
+        candidates = [move for move in self._moves_from(state)
+                      if move[0] <= room and self._log_counts[room - move[0]][move[1]] != -inf]
+        if profiling.active is not None:
+            profiling.count("completion.candidate_buckets", len(candidates))
+            profiling.count("completion.candidate_groups", sum(len(move[2]) for move in candidates))
+        for width, next_state, groups, weights, log_weight in candidates:
+            cumulative += exp(log_weight + self._log_counts[room - width][next_state] - total)
+            if target < cumulative:
+                break
+        # the last candidate absorbs any floating point shortfall
+        if weights is None:
+            return groups[rng.randrange(len(groups))]
+        return rng.choices(groups, weights)[0]
@@ -0,0 +1,148 @@
+from stitch import StitchEnum, Direction
+from enum import Enum, auto
+from itertools import product
+
+class RowKind(Enum):
+    FIRST = auto()
+    INCREASE = auto()
+    PLAIN = auto()
+
+class StitchPool:
+    __slots__ = ('stitches',)
+    def __init__(self, stitches):
+        self.stitches = tuple(stitches)
+    def __repr__(self):
+        return f"StitchPool({list(self.stitches)})"
+    def __len__(self):
+        return len(self.stitches)
+    def __iter__(self):
+        return iter(self.stitches)
+
+class GroupTemplate:
+    """How a drawn stitch is completed into a group that keeps the row balanced.
+
+    pools are drawn from in order; arrange(drawn) lays the stitch and the
+    drawn companions out in knitting order.
+    """
+    __slots__ = ('stitch', 'pools', 'arrange', 'width')
+    def __init__(self, stitch, pools=(), arrange=None):
+        self.stitch = stitch
+        self.pools = tuple(pools)
+        self.arrange = arrange if arrange is not None else (lambda drawn: (stitch,))
+        self.width = sum(st.ending_size for st in self.arrange(tuple(pool.stitches[0] for pool in self.pools)))
+    def __repr__(self):
+        return f"GroupTemplate({self.stitch}, pools={list(self.pools)})"
+    def groups(self):
+        """Every (drawn companions, group) this template can produce."""
+        for drawn in product(*[pool.stitches for pool in self.pools]):
+            yield drawn, self.arrange(drawn)
+
+class ConstraintTable:
+    # compiled tables keyed by the set of stitches that may not be adjacent
+    _compiled = {}
+
+    @classmethod
+    def compile(cls, restricted_stitches, weights=None):
+        key = (frozenset(restricted_stitches), None if weights is None else frozenset(weights.items()))
+        if key not in cls._compiled:
+            cls._compiled[key] = cls(restricted_stitches, weights)
+        return cls._compiled[key]
+
+    def __init__(self, restricted_stitches, weights=None):
+        # weights maps stitches to their relative weight, 1 if left out; a
+        # group of stitches weighs the product of its stitches' weights and
+        # generation draws among completions of a row in proportion to the
+        # product of its groups' weights (see RowCompleter)
+        self.restricted_stitches = frozenset(restricted_stitches)
+        self.weights = None if weights is None else dict(weights)
+        self.fillers = self._pool(StitchEnum.select(starting_size=1, ending_size=1))
+        self.thin_air = self._pool(StitchEnum.select(starting_size=0))
+        self.thin_air_not_left = self._pool(StitchEnum.select(starting_size=0, direction_not=Direction.LEFT))
+        self.thin_air_not_right = self._pool(StitchEnum.select(starting_size=0, direction_not=Direction.RIGHT))
+        self.decreases = self._pool(StitchEnum.select(starting_size=2, decrease=True))
+        self.left_decreases = self._pool(StitchEnum.select(starting_size=2, decrease=True, direction=Direction.LEFT))
+        self.right_decreases = self._pool(StitchEnum.select(starting_size=2, decrease=True, direction=Direction.RIGHT))
+        self.__allowed = {}
+        for row_kind in RowKind:
+            for previous_restricted in (False, True):
+                self.__allowed[(row_kind, previous_restricted)] = \
+                    self._pool(self._allowed_stitches(row_kind, previous_restricted))
+        self.__templates = {}
+        for row_kind in RowKind:
+            for stitch in self.__allowed[(row_kind, False)].stitches + self.__allowed[(row_kind, True)].stitches:
+                if (row_kind, stitch) not in self.__templates:
+                    self.__templates[(row_kind, stitch)] = self._template(row_kind, stitch)
+        self.max_width = max(template.width for template in self.__templates.values())
+        self.__viable = {}
+
+    def _pool(self, stitches):
+        return StitchPool(stitches)
+
+    def group_weight(self, group):
+        weight = 1
+        if self.weights is not None:
+            for stitch in group:
+                weight *= self.weights.get(stitch, 1)
+        return weight
+
+    def _allowed_stitches(self, row_kind, previous_restricted):
+        index = StitchEnum.index()
+        centred = index.mask_of({StitchEnum.CDD, StitchEnum.S2KP})
+        if row_kind == RowKind.FIRST:
+            allowed = index.mask(starting_size=1, ending_size=1)
+        elif row_kind == RowKind.INCREASE:
+            allowed = index.mask(starting_size_lt=2)
+        else:
+            allowed = index.all
+        # increase limitations
+        if previous_restricted:
+            allowed &= ~index.mask_of(self.restricted_stitches)
+            allowed &= index.mask(direction_not=Direction.LEFT) & ~centred
+        # eliminate all directional 3->1 decreases, it's too hard to fill the
+        # remaining 2 slots at random; also eliminate increases of +2 or more
+        allowed &= index.mask(starting_size_not=3) | centred
+        allowed &= index.mask(increased_stitch_count_lt=2)
+        return index.stitches(allowed)
+
+    def _template(self, row_kind, stitch):
+        if row_kind == RowKind.INCREASE:
+            # if 0->1 increase, add 1->1 stitch first; 1->1 stitches need a
+            # 0->1 increase after them; 1->2 increases stand alone
+            if stitch.starting_size == 0:
+                return GroupTemplate(stitch, [self.fillers], lambda drawn: (drawn[0], stitch))
+            if not stitch.is_increase():
+                return GroupTemplate(stitch, [self.thin_air], lambda drawn: (stitch, drawn[0]))
+        elif row_kind == RowKind.PLAIN:
+            if stitch.is_increase():
+                # increase on non-increase row. needs a corresponding decrease
+                # following the directionality rules
+                if stitch.direction == Direction.STRAIGHT:
+                    return GroupTemplate(stitch, [self.decreases],
+                                         lambda drawn: (stitch, drawn[0]) if drawn[0].direction == Direction.LEFT
+                                         else (drawn[0], stitch))
+                if stitch.direction == Direction.LEFT:
+                    return GroupTemplate(stitch, [self.right_decreases], lambda drawn: (drawn[0], stitch))
+                return GroupTemplate(stitch, [self.left_decreases], lambda drawn: (stitch, drawn[0]))
+            if stitch.is_decrease():
+                if stitch.starting_size == 3:
+                    # centered double decrease: increase before AND after
+                    return GroupTemplate(stitch, [self.thin_air_not_left, self.thin_air_not_right],
+                                         lambda drawn: (drawn[0], stitch, drawn[1]))
+                if stitch.direction == Direction.LEFT:
+                    return GroupTemplate(stitch, [self.thin_air_not_left], lambda drawn: (drawn[0], stitch))
+                return GroupTemplate(stitch, [self.thin_air_not_right], lambda drawn: (stitch, drawn[0]))
+        return GroupTemplate(stitch)
+
+    def template(self, row_kind, stitch):
+        return self.__templates[(row_kind, stitch)]
+
+    def viable_groups(self, template, automaton, state):
+        # (drawn, group) pairs the automaton accepts from state
+        key = (template, automaton, state)
+        if key not in self.__viable:
+            self.__viable[key] = [(drawn, group) for drawn, group in template.groups()
+                                  if automaton.run(group, state) is not None]
+        return self.__viable[key]
+
+    def allowed_after(self, row_kind, previous_restricted):
+        return self.__allowed[(row_kind, previous_restricted)]
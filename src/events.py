@@ -0,0 +1,57 @@
+from enum import Enum, auto
+from collections import deque
+
+class EventKind(Enum):
+    STITCH_PLACED = auto()
+    ROW_COMPLETED = auto()
+
+class GenerationEvent:
+    __slots__ = ('kind', 'coords', 'stitch_enum', 'row_num')
+    def __init__(self, kind, coords=None, stitch_enum=None, row_num=None):
+        self.kind = kind
+        self.coords = coords
+        self.stitch_enum = stitch_enum
+        self.row_num = row_num if row_num is not None or coords is None else coords.row_num
+    def __repr__(self):
+        return f"GenerationEvent(kind={self.kind.name},coords={self.coords!r},stitch={self.stitch_enum},row_num={self.row_num})"
+    def __str__(self):
+        if self.kind == EventKind.ROW_COMPLETED:
+            return f"row {self.row_num} completed"
+        return f"placed {self.stitch_enum} at {self.coords}"
+
+class EventRing:
+    """Event sink keeping the most recent events in a bounded buffer."""
+    def __init__(self, capacity=1024):
+        self.events = deque(maxlen=capacity)
+    def __call__(self, event):
+        self.events.append(event)
+    def __iter__(self):
+        return iter(self.events)
+    def __len__(self):
+        return len(self.events)
+    def of_kind(self, kind):
+        return [event for event in self.events if event.kind == kind]
+    def clear(self):
+        self.events.clear()
+
+def print_events(event):
+    """Event sink that prints every event, for watching a generation run."""
+    print(event)
+
+class ChangeSet:
+    """Rows, and slots within them, edited since the last take().
+
+    Obtained from CircularChart.track_changes(); every change set of a chart
+    sees every edit, so several views can each keep their own.
+    """
+    __slots__ = ('rows', '__weakref__')
+    def __init__(self):
+        self.rows = {}
+    def __bool__(self):
+        return bool(self.rows)
+    def add(self, row_num, slots):
+        self.rows.setdefault(row_num, set()).update(slots)
+    def take(self):
+        """Return {row_num: set of slots} and start collecting afresh."""
+        rows, self.rows = self.rows, {}
+        return rows
@@ -0,0 +1,42 @@
+from collections import deque
+
+class ChartHistory:
+    """Undo and redo for a CircularChart being edited.
+
+    Call commit() after each edit, or group of edits, that should be one
+    undo step. Every entry is a CircularChart snapshot, so an entry costs
+    one reference per row plus whichever rows were edited since the
+    previous one. limit caps how many undo steps are kept.
+    """
+    def __init__(self, chart, limit=None):
+        self.chart = chart
+        self.__undo = deque([chart.snapshot()], maxlen=None if limit is None else limit + 1)
+        self.__redo = []
+
+    def commit(self):
+        self.__undo.append(self.chart.snapshot())
+        self.__redo.clear()
+
+    def can_undo(self):
+        return len(self.__undo) > 1
+
+    def can_redo(self):
+        return len(self.__redo) > 0
+
+    def undo(self):
+        assert self.can_undo(), "nothing to undo"
+        self.__redo.append(self.__undo.pop())
+        self.chart.restore(self.__undo[-1])
+
+    def redo(self):
+        assert self.can_redo(), "nothing to redo"
+        self.__undo.append(self.__redo.pop())
+        self.chart.restore(self.__undo[-1])
+
+    def revert(self):
+        # drop edits made since the last commit
+        self.chart.restore(self.__undo[-1])
+
+    def fork(self):
+        """A new chart starting from the current one, with its own history."""
+        return ChartHistory(self.chart.fork())
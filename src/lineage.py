@@ -0,0 +1,126 @@
+"""Which stitches of each row were worked into which stitches of the row below.
+
+Each row works the loops of the row below in order: its stitches, left to
+right, take starting_size loops each from slot 0 of the previous row on
+(rows are filled from slot 0, as generate_random_chart does). So the links
+between rows r - 1 and r depend only on row r. LineageIndex keeps them in
+flat arrays indexed by chart offset (see CircularChart._offset_of):
+
+    parent[o]   for the stitch starting at offset o, the first slot of the
+                row below it works into
+    after[o]    how many loops of the row below the row has used up to and
+                including slot o
+    child[o]    for slot o, the slot of the row above where the stitch that
+                works it starts, or -1
+
+Edits reach the index through a ChangeSet. A row is rescanned from its first
+edited slot the next time it is queried, so filling a row in order costs
+O(1) per stitch and each query is O(stitch size).
+"""
+from array import array
+
+class LineageIndex:
+    def __init__(self, chart):
+        self.chart = chart
+        total = chart._row_starts[-1]
+        self.__parent = array('l', [-1]) * total
+        self.__after = array('l', [0]) * total
+        self.__child = array('l', [-1]) * total
+        # per row: slots before valid_until are indexed; stitches never
+        # reach past extent
+        self.__valid_until = [0] * chart.num_rows
+        self.__extent = [0 if chart[row_num].is_empty() else chart[row_num].stitch_count
+                         for row_num in range(chart.num_rows)]
+        # per row: loops of the row below used by the indexed slots
+        self.__consumed = [0] * chart.num_rows
+        self.__changes = chart.track_changes()
+
+    def __repr__(self):
+        return f"LineageIndex({self.chart!r})"
+
+    def __apply_changes(self):
+        for row_num, slots in self.__changes.take().items():
+            if slots:
+                self.__valid_until[row_num] = min(self.__valid_until[row_num], min(slots))
+                self.__extent[row_num] = max(self.__extent[row_num], max(slots) + 1)
+
+    def __refresh(self, row_num):
+        # bring the links between row_num - 1 and row_num up to date
+        self.__apply_changes()
+        start = self.__valid_until[row_num]
+        extent = self.__extent[row_num]
+        if row_num == 0 or start >= extent:
+            return
+        chart = self.chart
+        row = chart[row_num]
+        stitch = row[start]
+        if stitch is not None and stitch._start_index < start:
+            start = stitch._start_index
+        base = chart._offset_of(row_num, 0)
+        below_base = chart._offset_of(row_num - 1, 0)
+        below_count = chart[row_num - 1].stitch_count
+        parent, after, child = self.__parent, self.__after, self.__child
+        position = after[base + start - 1] if start > 0 else 0
+        # drop the links made by the part of the row being rescanned
+        for i in range(below_base + min(position, below_count),
+                       below_base + min(self.__consumed[row_num], below_count)):
+            child[i] = -1
+        previous = None
+        for slot in range(start, extent):
+            stitch = row[slot]
+            if stitch is not None and stitch is not previous:
+                parent[base + slot] = position
+                for i in range(below_base + position, below_base + min(position + stitch.stitch_enum.starting_size,
+                                                                       below_count)):
+                    child[i] = slot
+                position += stitch.stitch_enum.starting_size
+            after[base + slot] = position
+            previous = stitch
+        self.__valid_until[row_num] = extent
+        self.__consumed[row_num] = position
+
+    def parent_slots(self, row_num, stitch_num):
+        """Slots of the row below worked by the stitch covering (row_num, stitch_num)."""
+        stitch = self.chart[row_num][stitch_num]
+        if stitch is None or row_num == 0:
+            return range(0)
+        self.__refresh(row_num)
+        first = self.__parent[self.chart._offset_of(row_num, stitch._start_index)]
+        return range(first, min(first + stitch.stitch_enum.starting_size, self.chart[row_num - 1].stitch_count))
+
+    def child_slots(self, row_num, stitch_num):
+        """Start slots, in the row above, of the stitches worked into the stitch covering (row_num, stitch_num)."""
+        row = self.chart[row_num]
+        stitch = row[stitch_num]
+        if stitch is None or row_num + 1 >= self.chart.num_rows:
+            return []
+        self.__refresh(row_num + 1)
+        base = self.chart._offset_of(row_num, 0)
+        starts = []
+        for slot in range(stitch._start_index, min(stitch._start_index + stitch.span(), row.stitch_count)):
+            start = self.__child[base + slot]
+            if start >= 0 and (not starts or starts[-1] != start):
+                starts.append(start)
+        return starts
+
+    def parents(self, row_num, stitch_num):
+        below = self.chart[row_num - 1] if row_num > 0 else None
+        stitches = []
+        for slot in self.parent_slots(row_num, stitch_num):
+            stitch = below[slot]
+            if stitch is not None and (not stitches or stitches[-1] is not stitch):
+                stitches.append(stitch)
+        return stitches
+
+    def children(self, row_num, stitch_num):
+        above = self.chart[row_num + 1]
+        return [above[slot] for slot in self.child_slots(row_num, stitch_num)]
+
+    def below(self, row_num, stitch_num):
+        # the stitch directly below: the first one this stitch was worked into
+        parents = self.parents(row_num, stitch_num)
+        return parents[0] if parents else None
+
+    def above(self, row_num, stitch_num):
+        children = self.child_slots(row_num, stitch_num)
+        return self.chart[row_num + 1][children[0]] if children else None
@@ -0,0 +1,185 @@
+"""Counters and timers for finding where generation and rendering spend time.
+
+    with profiling.profile() as prof:
+        chart.generate_random_chart()
+    print(prof.summary())
+
+While a profile is active, the methods in HOT_PATHS are swapped for timed
+wrappers and the package's count() calls are recorded; when none is active
+the original methods are back in place and count() sites cost a single
+`profiling.active is not None` test. Setting KNITTING_PI_PROFILE=<path>
+profiles the whole process (see activate_from_environment) and writes the
+result on exit, as JSON, or as a pstats file if the path ends in .prof.
+
+Timers record calls, total (cumulative) time and own time (total minus
+time in nested timed calls), so the pstats export loads with
+pstats.Stats(path) like a cProfile dump.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import atexit
+import json
+import marshal
+import os
+import pstats
+import io
+import sys
+import time
+
+# (module, class or None, attribute) of everything timed while profiling
+HOT_PATHS = (
+    ("circular_chart", "CircularChart", "generate_random_chart"),
+    ("circular_chart", "CircularChart", "chart_print_string"),
+    ("circular_chart", "CircularChart", "row_print_string"),
+    ("circular_chart", "CircularChart", "print_chart_2"),
+    ("circular_chart", "CircularChart", "increment_coords"),
+    ("circular_chart", "CircularChart", "advance"),
+    ("circular_chart", "CircularChart", "from_payload"),
+    ("circular_chart", "CircularChart", "to_payload"),
+    ("row", "Row", "__setitem__"),
+    ("row", "Row", "__getitem__"),
+    ("row", "Row", "stitches"),
+    ("row", "Row", "stitches_print_string"),
+    ("row", "Row", "validate"),
+    ("chart", "LiveStitch", "all_coords"),
+    ("chart", "LiveStitch", "end_coords"),
+    ("completion", "RowCompleter", "sample"),
+    ("completion", "RowCompleter", "_extend"),
+    ("constraint_table", "ConstraintTable", "compile"),
+    ("rule_engine", "RuleAutomaton", "compile"),
+    ("render", None, "write_svg"),
+    ("render", None, "write_png"),
+    ("written_pattern", None, "write_pattern"),
+)
+
+# the running Profile, or None
+active = None
+
+def count(name, n=1):
+    # call sites guard with `if profiling.active is not None` so that a
+    # disabled profile costs no call
+    if active is not None:
+        active.counters[name] = active.counters.get(name, 0) + n
+
+class Profile:
+    def __init__(self):
+        self.counters = {}
+        # name -> [calls, total seconds, own seconds]
+        self.timers = {}
+        self.__stack = []
+        self.__patched = []
+
+    def _timed(self, name, function):
+        timers = self.timers
+        stack = self.__stack
+        @wraps(function)
+        def timed(*args, **kwargs):
+            # stack entries accumulate the time of nested timed calls
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                entry = timers.get(name)
+                if entry is None:
+                    entry = timers[name] = [0, 0.0, 0.0]
+                entry[0] += 1
+                entry[1] += elapsed
+                entry[2] += elapsed - nested
+        return timed
+
+    def _install(self):
+        for module_name, class_name, attribute in HOT_PATHS:
+            # only modules the program uses; profiling must not pull in NumPy
+            module = sys.modules.get(module_name)
+            if module is None:
+                continue
+            owner = module if class_name is None else getattr(module, class_name)
+            original = owner.__dict__[attribute] if class_name is not None else getattr(owner, attribute)
+            name = f"{module_name}.{class_name + '.' if class_name else ''}{attribute}"
+            if isinstance(original, classmethod):
+                replacement = classmethod(self._timed(name, original.__func__))
+            elif isinstance(original, staticmethod):
+                replacement = staticmethod(self._timed(name, original.__func__))
+            else:
+                replacement = self._timed(name, original)
+            setattr(owner, attribute, replacement)
+            self.__patched.append((owner, attribute, original))
+
+    def _uninstall(self):
+        for owner, attribute, original in reversed(self.__patched):
+            setattr(owner, attribute, original)
+        self.__patched = []
+
+    def to_dict(self):
+        return {"counters": dict(sorted(self.counters.items())),
+                "timers": {name: {"calls": calls, "total": total, "own": own}
+                           for name, (calls, total, own) in sorted(self.timers.items())}}
+
+    def write_json(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def _pstats_entries(self):
+        # the dict pstats.Stats loads: (file, line, function) -> (primitive
+        # calls, calls, own time, total time, callers)
+        return {("knitting-pi", 0, name): (calls, calls, own, total, {})
+                for name, (calls, total, own) in self.timers.items()}
+
+    def dump_stats(self, path):
+        with open(path, "wb") as file:
+            marshal.dump(self._pstats_entries(), file)
+
+    def summary(self, sort="tottime", limit=30):
+        """cProfile-style table of the timers, followed by the counters."""
+        output = io.StringIO()
+        stats = pstats.Stats(_StatsSource(self._pstats_entries()), stream=output)
+        stats.sort_stats(sort).print_stats(limit)
+        for name, value in sorted(self.counters.items()):
+            output.write(f"{value:>12}  {name}\n")
+        return output.getvalue()
+
+class _StatsSource:
+    # what pstats.Stats expects of a profiler object
+    def __init__(self, entries):
+        self.stats = entries
+    def create_stats(self):
+        pass
+
+@contextmanager
+def profile():
+    """Profile the enclosed code; profiles do not nest."""
+    global active
+    assert active is None, "a profile is already running"
+    prof = Profile()
+    prof._install()
+    active = prof
+    try:
+        yield prof
+    finally:
+        active = None
+        prof._uninstall()
+
+def activate_from_environment():
+    """Start a whole-process profile if KNITTING_PI_PROFILE is set.
+
+    Called once circular_chart has finished importing, so the hot modules
+    exist to be wrapped; the profile is written when the process exits.
+    """
+    global active
+    path = os.environ.get("KNITTING_PI_PROFILE")
+    if not path or active is not None:
+        return
+    prof = Profile()
+    prof._install()
+    active = prof
+    def finish():
+        if path.endswith(".prof"):
+            prof.dump_stats(path)
+        else:
+            prof.write_json(path)
+    atexit.register(finish)
@@ -0,0 +1,272 @@
+"""Polar chart rendering to SVG and PNG.
+
+Each row is drawn as a ring (row 0 innermost) split into stitch_count
+slots, and each stitch as a wedge over the slots it spans. All wedge
+geometry is computed at once with NumPy; SVG output is streamed in
+chunks and reuses one cached glyph definition per stitch type.
+"""
+from stitch import StitchEnum, Direction
+from functools import lru_cache
+import numpy as np
+import struct
+import zlib
+
+STITCHES = tuple(StitchEnum)
+_CHUNK = 2048
+
+def _stitch_colour(stitch):
+    if stitch.starting_size == 0:
+        return (255, 255, 255)
+    if stitch.is_increase():
+        return (190, 225, 190)
+    if stitch.is_decrease():
+        return {Direction.LEFT: (170, 200, 235), Direction.RIGHT: (235, 190, 170),
+                Direction.STRAIGHT: (215, 190, 235)}[stitch.direction]
+    if stitch.is_cable():
+        return (240, 220, 150)
+    if stitch == StitchEnum.BOBBLE:
+        return (120, 120, 120)
+    if stitch in {StitchEnum.PURL, StitchEnum.PTBL}:
+        return (200, 200, 200)
+    return (245, 240, 225)
+
+PALETTE = np.array([_stitch_colour(stitch) for stitch in STITCHES], dtype=np.uint8)
+
+@lru_cache(maxsize=None)
+def glyph_path(stitch):
+    """SVG path data for stitch's symbol, drawn in a box from -1 to 1."""
+    if stitch.starting_size == 0:
+        return "M -0.6 0 A 0.6 0.6 0 1 0 0.6 0 A 0.6 0.6 0 1 0 -0.6 0 Z"
+    if stitch.is_increase():
+        return "M -0.7 0.7 L 0 -0.7 L 0.7 0.7 M 0 -0.7 L 0 0.7"
+    if stitch.is_decrease():
+        return {Direction.RIGHT: "M -0.7 0.7 L 0.7 -0.7",
+                Direction.LEFT: "M -0.7 -0.7 L 0.7 0.7",
+                Direction.STRAIGHT: "M -0.7 -0.7 L 0 0.7 L 0.7 -0.7 M 0 0.7 L 0 -0.7"}[stitch.direction]
+    if stitch.is_cable():
+        return "M -0.8 0.7 L 0.8 -0.7 M -0.8 -0.7 L 0.8 0.7"
+    if stitch == StitchEnum.BOBBLE:
+        return "M -0.5 0 A 0.5 0.5 0 1 0 0.5 0 A 0.5 0.5 0 1 0 -0.5 0 Z"
+    if stitch in {StitchEnum.PURL, StitchEnum.PTBL}:
+        return "M -0.7 0 L 0.7 0"
+    return "M 0 -0.7 L 0 0.7"
+
+class ChartGeometry:
+    """Wedge geometry for every stitch of a chart, as parallel arrays."""
+    def __init__(self, chart, size=800, hole=0.15, margin=4, row_nums=None):
+        # row_nums limits the stitches to some rows; the rings are laid out
+        # for the whole chart either way
+        if row_nums is None:
+            row_nums = range(chart.num_rows)
+        selected = row_nums
+        row_nums, starts, spans, codes = [], [], [], []
+        self.stitch_counts = np.array([chart[row_num].stitch_count for row_num in range(chart.num_rows)],
+                                      dtype=np.float64)
+        for row_num in selected:
+            for stitch in chart[row_num].stitches():
+                row_nums.append(row_num)
+                starts.append(stitch._start_index)
+                spans.append(stitch.span())
+                codes.append(stitch.stitch_enum.code())
+        self.num_rows = chart.num_rows
+        self.size = size
+        self.centre = size / 2
+        self.hole_radius = (size / 2 - margin) * hole
+        self.ring_width = (size / 2 - margin - self.hole_radius) / max(self.num_rows, 1)
+        self.row_nums = np.array(row_nums, dtype=np.int64)
+        self.codes = np.array(codes, dtype=np.int64)
+        counts = self.stitch_counts[self.row_nums]
+        starts = np.array(starts, dtype=np.float64)
+        # a stitch that wraps into the next row is drawn up to the end of its own row
+        ends = np.minimum(starts + np.array(spans, dtype=np.float64), counts)
+        self.inner = self.hole_radius + self.row_nums * self.ring_width
+        self.outer = self.inner + self.ring_width
+        # angles run clockwise from the top; keep full rings just short of a
+        # closed circle so the arcs stay drawable
+        self.theta0 = -np.pi / 2 + 2 * np.pi * starts / counts
+        self.theta1 = np.minimum(-np.pi / 2 + 2 * np.pi * ends / counts, self.theta0 + 2 * np.pi - 1e-6)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def subset(self, index):
+        # the same geometry restricted to some of its stitches
+        part = object.__new__(ChartGeometry)
+        part.__dict__.update(self.__dict__)
+        for name in ('row_nums', 'codes', 'inner', 'outer', 'theta0', 'theta1'):
+            setattr(part, name, getattr(self, name)[index])
+        return part
+
+    def wedge_points(self):
+        c = self.centre
+        cos0, sin0, cos1, sin1 = np.cos(self.theta0), np.sin(self.theta0), np.cos(self.theta1), np.sin(self.theta1)
+        return (c + self.outer * cos0, c + self.outer * sin0, c + self.outer * cos1, c + self.outer * sin1,
+                c + self.inner * cos1, c + self.inner * sin1, c + self.inner * cos0, c + self.inner * sin0)
+
+    def glyph_placement(self):
+        # centre point, rotation in degrees and scale of each wedge's glyph
+        middle = (self.theta0 + self.theta1) / 2
+        radius = (self.inner + self.outer) / 2
+        arc = radius * (self.theta1 - self.theta0)
+        scale = 0.35 * np.minimum(arc, self.ring_width)
+        return (self.centre + radius * np.cos(middle), self.centre + radius * np.sin(middle),
+                np.degrees(middle) + 90, scale)
+
+def _open(target, mode):
+    if isinstance(target, str):
+        return open(target, mode, buffering=1 << 16), True
+    return target, False
+
+def _svg_header(size):
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            f'width="{size}" height="{size}" viewBox="0 0 {size} {size}">\n')
+
+def _svg_defs(codes):
+    return "<defs>\n" + "".join(f'<path id="g{code}" d="{glyph_path(STITCHES[code])}"/>\n'
+                                 for code in codes) + "</defs>\n"
+
+_FILLS = ["#%02x%02x%02x" % tuple(colour) for colour in PALETTE]
+
+def _svg_wedges(geometry):
+    # yields the wedge paths a chunk at a time
+    x0, y0, x1, y1, x2, y2, x3, y3 = geometry.wedge_points()
+    large = ((geometry.theta1 - geometry.theta0) > np.pi).astype(int)
+    for start in range(0, len(geometry), _CHUNK):
+        chunk = slice(start, start + _CHUNK)
+        yield "".join(
+            f'<path d="M{a:.2f} {b:.2f}A{ro:.2f} {ro:.2f} 0 {l} 1 {c:.2f} {d:.2f}'
+            f'L{e:.2f} {f:.2f}A{ri:.2f} {ri:.2f} 0 {l} 0 {g:.2f} {h:.2f}Z" fill="{_FILLS[code]}"/>\n'
+            for a, b, c, d, e, f, g, h, ro, ri, l, code in zip(
+                x0[chunk].tolist(), y0[chunk].tolist(), x1[chunk].tolist(), y1[chunk].tolist(),
+                x2[chunk].tolist(), y2[chunk].tolist(), x3[chunk].tolist(), y3[chunk].tolist(),
+                geometry.outer[chunk].tolist(), geometry.inner[chunk].tolist(), large[chunk].tolist(),
+                geometry.codes[chunk].tolist()))
+
+def _svg_glyphs(geometry):
+    gx, gy, rotation, scale = geometry.glyph_placement()
+    for start in range(0, len(geometry), _CHUNK):
+        chunk = slice(start, start + _CHUNK)
+        yield "".join(
+            f'<use xlink:href="#g{code}" transform="translate({x:.2f} {y:.2f}) rotate({r:.1f}) '
+            f'scale({s:.3f})" stroke-width="{0.15 / max(s, 1e-3) * 4:.3f}"/>\n'
+            for x, y, r, s, code in zip(gx[chunk].tolist(), gy[chunk].tolist(), rotation[chunk].tolist(),
+                                        scale[chunk].tolist(), geometry.codes[chunk].tolist()))
+
+_WEDGES_OPEN = '<g stroke="#444" stroke-width="0.5">\n'
+_GLYPHS_OPEN = '<g fill="none" stroke="#000" stroke-linecap="round">\n'
+
+def write_svg(chart, target, size=800, hole=0.15, glyphs=True):
+    """Write chart as SVG to a path or a text file object."""
+    geometry = ChartGeometry(chart, size, hole)
+    file, owned = _open(target, "w")
+    try:
+        file.write(_svg_header(size))
+        file.write(_svg_defs(sorted(set(geometry.codes.tolist()))))
+        file.write(_WEDGES_OPEN)
+        for chunk in _svg_wedges(geometry):
+            file.write(chunk)
+        file.write('</g>\n')
+        if glyphs:
+            file.write(_GLYPHS_OPEN)
+            for chunk in _svg_glyphs(geometry):
+                file.write(chunk)
+            file.write('</g>\n')
+        file.write('</svg>\n')
+    finally:
+        if owned:
+            file.close()
+
+class SvgView:
+    """SVG for a chart being edited in place.
+
+    Keeps the markup of each row and rebuilds only the rows edited since the
+    last render (see CircularChart.track_changes).
+    """
+    def __init__(self, chart, size=800, hole=0.15, glyphs=True):
+        self.chart = chart
+        self.size = size
+        self.hole = hole
+        self.glyphs = glyphs
+        self.__changes = chart.track_changes()
+        self.__rows = [""] * chart.num_rows
+        for row_num in range(chart.num_rows):
+            self.__changes.add(row_num, ())
+
+    def render_rows(self):
+        # {row_num: markup} for just the rows rebuilt by this call
+        dirty = sorted(self.__changes.take())
+        if not dirty:
+            return {}
+        geometry = ChartGeometry(self.chart, self.size, self.hole, row_nums=dirty)
+        rebuilt = {}
+        bounds = np.searchsorted(geometry.row_nums, dirty + [dirty[-1] + 1])
+        for row_num, start, end in zip(dirty, bounds, bounds[1:]):
+            row = geometry.subset(slice(start, end))
+            markup = f'<g id="row{row_num}">\n{_WEDGES_OPEN}{"".join(_svg_wedges(row))}</g>\n'
+            if self.glyphs:
+                markup += f'{_GLYPHS_OPEN}{"".join(_svg_glyphs(row))}</g>\n'
+            rebuilt[row_num] = self.__rows[row_num] = markup + '</g>\n'
+        return rebuilt
+
+    def render(self):
+        self.render_rows()
+        return _svg_header(self.size) + _svg_defs(range(len(STITCHES))) + "".join(self.__rows) + '</svg>\n'
+
+    def write(self, target):
+        self.render_rows()
+        file, owned = _open(target, "w")
+        try:
+            file.write(_svg_header(self.size))
+            file.write(_svg_defs(range(len(STITCHES))))
+            for markup in self.__rows:
+                file.write(markup)
+            file.write('</svg>\n')
+        finally:
+            if owned:
+                file.close()
+
+def raster(chart, size=800, hole=0.15, background=(255, 255, 255)):
+    """RGB image of chart as a (size, size, 3) uint8 array, one colour per stitch type."""
+    geometry = ChartGeometry(chart, size, hole)
+    # slot -> code lookup for every row, flattened with row offsets
+    counts = geometry.stitch_counts.astype(np.int64)
+    row_offsets = np.concatenate(([0], np.cumsum(counts)))
+    slot_codes = np.full(row_offsets[-1] + 1, -1, dtype=np.int64)
+    starts = np.rint((geometry.theta0 + np.pi / 2) / (2 * np.pi) * counts[geometry.row_nums]).astype(np.int64)
+    ends = np.rint((geometry.theta1 + np.pi / 2) / (2 * np.pi) * counts[geometry.row_nums]).astype(np.int64)
+    spans = ends - starts
+    slot_index = np.repeat(row_offsets[geometry.row_nums] + starts, spans) + \
+        (np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans))
+    slot_codes[slot_index] = np.repeat(geometry.codes, spans)
+
+    ys, xs = np.mgrid[0:size, 0:size].astype(np.float64) + 0.5
+    dx, dy = xs - geometry.centre, ys - geometry.centre
+    radius = np.hypot(dx, dy)
+    row = np.floor((radius - geometry.hole_radius) / geometry.ring_width).astype(np.int64)
+    inside = (radius >= geometry.hole_radius) & (row >= 0) & (row < geometry.num_rows)
+    row = np.clip(row, 0, max(geometry.num_rows - 1, 0))
+    angle = np.mod(np.arctan2(dy, dx) + np.pi / 2, 2 * np.pi)
+    slot = np.minimum((angle / (2 * np.pi) * counts[row]).astype(np.int64), counts[row] - 1)
+    code = np.where(inside, slot_codes[row_offsets[row] + slot], -1)
+    image = np.empty((size, size, 3), dtype=np.uint8)
+    image[:] = background
+    filled = code >= 0
+    image[filled] = PALETTE[code[filled]]
+    return image
+
+def write_png(chart, target, size=800, hole=0.15):
+    """Write chart as a PNG to a path or a binary file object."""
+    image = raster(chart, size, hole)
+    # every scanline starts with filter type 0 (none)
+    scanlines = np.concatenate((np.zeros((size, 1), dtype=np.uint8), image.reshape(size, -1)), axis=1)
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    file, owned = _open(target, "wb")
+    try:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6)))
+        file.write(chunk(b"IEND", b""))
+    finally:
+        if owned:
+            file.close()
@@ -1,48 +1,195 @@
-from chart import LiveStitch, StitchCoords
+from chart import LiveStitch
+from rules import row_rules
+from rule_engine import RuleAutomaton
+from stitch import StitchEnum
+import profiling
+
+NUM_STITCH_CODES = len(StitchEnum)
+
+class RowState:
+    """The contents of a Row, shareable between snapshots and forks.
+
+    A state is never changed once shared; Row copies it on the next write
+    (see CircularChart.snapshot).
+    """
+    __slots__ = ('owners', 'num_stitches', 'num_filled', 'counts', 'rule_state', 'rule_state_end',
+                 'rule_state_stale', 'row', 'shared')
+    def __init__(self, row, stitch_count, rule_state):
+        # one entry per slot: the LiveStitch of the row that covers it
+        self.owners = [None] * stitch_count
+        self.num_stitches = 0
+        self.num_filled = 0
+        # number of each stitch in the row, indexed by stitch code
+        self.counts = [0] * NUM_STITCH_CODES
+        self.rule_state = rule_state
+        self.rule_state_end = 0
+        self.rule_state_stale = False
+        # the Row the LiveStitches in owners belong to
+        self.row = row
+        self.shared = False
+    def copy_for(self, row):
+        copy = RowState.__new__(RowState)
+        if row is self.row:
+            copy.owners = list(self.owners)
+        else:
+            # stitches point back at their row, so a fork gets its own
+            copy.owners = []
+            previous = rebound = None
+            for stitch in self.owners:
+                if stitch is not previous:
+                    rebound = None if stitch is None else LiveStitch(stitch.stitch_enum, stitch._start_index, row)
+                    previous = stitch
+                copy.owners.append(rebound)
+        copy.num_stitches = self.num_stitches
+        copy.num_filled = self.num_filled
+        copy.counts = list(self.counts)
+        copy.rule_state = self.rule_state
+        copy.rule_state_end = self.rule_state_end
+        copy.rule_state_stale = self.rule_state_stale
+        copy.row = row
+        copy.shared = False
+        return copy
 
 class Row:
-    def set_rules(self):
-        self.__rules = []
-        if self.row_num == 0 or self.row_num % 2 == 1 or self.is_increase_row():
-            self.__rules.append('NoIncreasesRowRule')
-            self.__rules.append('NoDecreasesRowRule')
-            self.__rules.append('NoCablesRowRule')
-        if self.is_increase_row():
-            self.__rules.append('DoubleStitchCountIncreaseRowRule')
-    def __init__(self, row_num, stitch_count, chart):
+    def set_rules(self, rules=None):
+        if rules is None:
+            rules = row_rules(self.row_num, self.is_increase_row())
+        self.__rules = tuple(rules)
+        self.__automaton = RuleAutomaton.compile(self.__rules)
+        self.__reset_rule_state()
+    def __init__(self, row_num, stitch_count, chart, state=None, rules=None):
         self.row_num = row_num
         self.stitch_count = stitch_count
         self._chart = chart
-        self.__stitches = []
-        self.set_rules()
+        if state is None:
+            self.__state = RowState(self, stitch_count, None)
+            self.set_rules(rules)
+        else:
+            self._set_state(state, rules)
     def __repr__(self):
         return f"Row(row_num={self.row_num},stitch_count={self.stitch_count})"
     def __str__(self):
         return f"Row(#{self.row_num}: {self.stitch_count}sts)"
-    def __getitem__(self, stitch_index):
+    def __check_index(self, stitch_index):
         if stitch_index < 0 or stitch_index >= self.stitch_count:
             raise IndexError(f"Invalid stitch: {stitch_index} (only {self.stitch_count} available)")
-        coords = StitchCoords(self.row_num, stitch_index)
-        for stitch in self.__stitches:
-            if coords in stitch.coords:
-                return stitch
+    def __slots_of(self, stitch_index, stitch_enum):
+        # slots past the end of the row belong to the next row's numbering and
+        # are never owned here
+        return range(stitch_index, min(stitch_index + stitch_enum.ending_size, self.stitch_count))
+    def __read_state(self):
+        state = self.__state
+        if state.row is not self:
+            state = self.__state = state.copy_for(self)
+        return state
+    def __write_state(self):
+        state = self.__state
+        if state.shared or state.row is not self:
+            if profiling.active is not None:
+                profiling.count("row.copy_on_write")
+            state = self.__state = state.copy_for(self)
+        return state
+    def _state(self):
+        # the current contents, marked shared so the next write copies them
+        self.__state.shared = True
+        return self.__state
+    def _set_state(self, state, rules=None):
+        # adopt a state taken with _state(), along with the rules its rule
+        # state was computed under
+        if rules is None:
+            rules = row_rules(self.row_num, self.is_increase_row())
+        state.shared = True
+        self.__state = state
+        self.__rules = tuple(rules)
+        self.__automaton = RuleAutomaton.compile(self.__rules)
+    def __release(self, state, stitch):
+        if profiling.active is not None:
+            profiling.count("row.replaced_stitches")
+        slots = self.__slots_of(stitch._start_index, stitch.stitch_enum)
+        for i in slots:
+            state.owners[i] = None
+        state.num_stitches -= 1
+        state.num_filled -= len(slots)
+        code = stitch.stitch_enum.code()
+        state.counts[code] -= 1
+        self._chart._stitch_totals[code] -= 1
+        state.rule_state_stale = True
+    def __getitem__(self, stitch_index):
+        self.__check_index(stitch_index)
+        return self.__read_state().owners[stitch_index]
     def __setitem__(self, stitch_index, stitch_enum):
-        affected_coords = []
-        initial_coords = StitchCoords(self.row_num, stitch_index)
-        next_coords = initial_coords
-        for i in range(stitch_enum.starting_size):
-            affected_coords.append(next_coords)
-            next_coords = self._chart.increment_coords(next_coords)
-        affected_stitches = []
-        affected_coords = set(affected_coords)
-        for stitch in self.__stitches:
-            if len(affected_coords.intersection(stitch.coords)) > 0:
-                affected_stitches.append(stitch)
-        for stitch in affected_stitches:
-            self.__stitches.remove(stitch)
-        self.__stitches.append(LiveStitch(stitch_enum, stitch_index, self))
-        self.__stitches.sort()
-        return self[stitch_index]
+        self.__check_index(stitch_index)
+        state = self.__write_state()
+        owners = state.owners
+        slots = self.__slots_of(stitch_index, stitch_enum)
+        # everything the new stitch or a stitch it replaces covered needs redrawing
+        dirty_start, dirty_end = stitch_index, stitch_index + stitch_enum.ending_size
+        for i in slots:
+            stitch = owners[i]
+            if stitch is not None:
+                dirty_start = min(dirty_start, stitch._start_index)
+                dirty_end = max(dirty_end, stitch._start_index + stitch.span())
+                self.__release(state, stitch)
+        new_stitch = LiveStitch(stitch_enum, stitch_index, self)
+        for i in slots:
+            owners[i] = new_stitch
+        state.num_stitches += 1
+        state.num_filled += len(slots)
+        code = stitch_enum.code()
+        state.counts[code] += 1
+        self._chart._stitch_totals[code] += 1
+        # stitches appended in order keep the rule state current in O(1)
+        if stitch_index >= state.rule_state_end and not state.rule_state_stale:
+            state.rule_state = self.__automaton.step(state.rule_state, stitch_enum) \
+                if state.rule_state is not None else None
+            state.rule_state_end = stitch_index + stitch_enum.ending_size
+        else:
+            state.rule_state_stale = True
+        self._chart._mark_dirty(self.row_num, dirty_start, dirty_end)
+        return new_stitch
+    def __reset_rule_state(self):
+        state = self.__write_state()
+        state.rule_state = self.__automaton.start
+        state.rule_state_end = 0
+        state.rule_state_stale = False
+    def rules(self):
+        return self.__rules
+    def rule_automaton(self):
+        return self.__automaton
+    def rule_state(self):
+        # automaton state after this row's stitches, or None if they already
+        # break a rule
+        state = self.__read_state()
+        if state.rule_state_stale:
+            stitches = self.stitches()
+            if state.shared:
+                state = self.__write_state()
+            state.rule_state = self.__automaton.run([stitch.stitch_enum for stitch in stitches])
+            state.rule_state_end = stitches[-1]._start_index + stitches[-1].span() if stitches else 0
+            state.rule_state_stale = False
+        return state.rule_state
+    def accepts_next(self, new_stitches):
+        """Whether the group new_stitches can be appended and still satisfy this row's rules."""
+        width = sum(stitch_enum.ending_size for stitch_enum in new_stitches)
+        if self.current_size() + width > self.stitch_count:
+            return False
+        return self.__automaton.is_accepting(self.__automaton.run(new_stitches, self.rule_state()))
+    def validate(self):
+        return self.__automaton.is_accepting(self.rule_state())
+    def stitch_counts(self):
+        # number of each stitch in the row, indexed by stitch code; kept up
+        # to date by __setitem__, so treat it as read-only
+        return self.__state.counts
+    def current_size(self):
+        return self.__state.num_filled
+    def stitches(self):
+        ordered = []
+        previous = None
+        for stitch in self.__read_state().owners:
+            if stitch is not None and stitch is not previous:
+                ordered.append(stitch)
+            previous = stitch
+        return ordered
     def previous_row(self):
         return self._chart[self.row_num - 1]
     def next_row(self):
@@ -50,14 +197,9 @@ class Row:
     def is_increase_row(self):
         return self.row_num > 0 and self.stitch_count > self.previous_row().stitch_count
     def stitches_print_string(self):
-        row_string = ""
-        for stitch in self.__stitches:
-            if row_string != "":
-                row_string += " "
-            row_string += str(stitch.stitch_enum)
-        return row_string
+        return " ".join(str(stitch.stitch_enum) for stitch in self.stitches())
     def print_stitches(self):
         row_string = self.stitches_print_string()
         print(row_string)
     def is_empty(self):
-        return len(self.__stitches) == 0
+        return self.__state.num_stitches == 0
@@ -0,0 +1,135 @@
+from stitch import StitchEnum
+from collections import deque
+
+def _combo_trie(combos):
+    # node 0 is the root; children[node] maps a stitch to the next node and
+    # terminal holds the nodes that end a combination
+    children = [{}]
+    terminal = set()
+    for combo in combos:
+        node = 0
+        for stitch in combo:
+            if stitch not in children[node]:
+                children[node][stitch] = len(children)
+                children.append({})
+            node = children[node][stitch]
+        terminal.add(node)
+    return children, frozenset(terminal)
+
+# default for run(): start from the automaton's start state
+_START = object()
+
+class RuleAutomaton:
+    """Deterministic acceptor for the intersection of a set of row rules.
+
+    A rule accepts a stitch sequence when it splits into the rule's valid
+    stitch combinations and no two neighbouring stitches are forbidden by
+    the rule's forbids_adjacent(). The automaton is built once per rule set
+    and only keeps states from which an accepting state is still reachable,
+    so step() returning None means the sequence can never be completed.
+    States are small integers; stepping is one dict lookup per stitch.
+    """
+    _compiled = {}
+
+    @classmethod
+    def compile(cls, rules):
+        key = frozenset(rules)
+        if key not in cls._compiled:
+            cls._compiled[key] = cls(sorted(key, key=lambda rule: rule.__name__))
+        return cls._compiled[key]
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        alphabet = tuple(StitchEnum)
+        tries = [_combo_trie(rule.valid_stitch_combinations()) for rule in self.rules]
+        # the adjacency part of the state is the set of stitches that may not
+        # come next, which only has a handful of distinct values
+        forbidden_after = {first: frozenset(second for second in alphabet
+                                            if any(rule.forbids_adjacent(first, second) for rule in self.rules))
+                           for first in alphabet}
+
+        def step(raw_state, stitch):
+            nodes, forbidden = raw_state
+            if stitch in forbidden:
+                return None
+            next_nodes = []
+            for (children, terminal), current in zip(tries, nodes):
+                reached = set()
+                for node in current:
+                    child = children[node].get(stitch)
+                    if child is not None:
+                        # a leaf that ends a combination is the same as the root
+                        if children[child]:
+                            reached.add(child)
+                        if child in terminal:
+                            reached.add(0)
+                if not reached:
+                    return None
+                next_nodes.append(frozenset(reached))
+            return tuple(next_nodes), forbidden_after[stitch]
+
+        start = (tuple(frozenset([0]) for _ in tries), frozenset())
+        raw_states = [start]
+        ids = {start: 0}
+        edges = []
+        queue = deque([start])
+        while queue:
+            raw_state = queue.popleft()
+            out = {}
+            for stitch in alphabet:
+                target = step(raw_state, stitch)
+                if target is None:
+                    continue
+                if target not in ids:
+                    ids[target] = len(raw_states)
+                    raw_states.append(target)
+                    queue.append(target)
+                out[stitch] = ids[target]
+            edges.append(out)
+        accepting = [all(0 in nodes for nodes in raw_state[0]) for raw_state in raw_states]
+
+        # drop states that can no longer reach an accepting state
+        incoming = [[] for _ in raw_states]
+        for source, out in enumerate(edges):
+            for target in out.values():
+                incoming[target].append(source)
+        live = {state for state, is_accepting in enumerate(accepting) if is_accepting}
+        queue = deque(live)
+        while queue:
+            for source in incoming[queue.popleft()]:
+                if source not in live:
+                    live.add(source)
+                    queue.append(source)
+
+        self.start = 0 if 0 in live else None
+        self._edges = [{stitch: target for stitch, target in out.items() if target in live} for out in edges]
+        self._accepting = accepting
+
+    def __repr__(self):
+        return f"RuleAutomaton(rules={[rule.__name__ for rule in self.rules]},states={len(self._edges)})"
+
+    def num_states(self):
+        return len(self._edges)
+
+    def step(self, state, stitch):
+        return self._edges[state].get(stitch)
+
+    def run(self, stitches, state=_START):
+        # state None is the dead state step() and run() return, so a run from
+        # it stays dead; leave state out to run from the start
+        if state is _START:
+            state = self.start
+        for stitch in stitches:
+            if state is None:
+                return None
+            state = self._edges[state].get(stitch)
+        return state
+
+    def is_accepting(self, state):
+        return state is not None and self._accepting[state]
+
+    def accepts(self, stitches):
+        return self.is_accepting(self.run(stitches))
+
+    def allowed_next(self, state):
+        return self._edges[state].keys()
@@ -1,4 +1,5 @@
 from stitch import StitchEnum, Direction
+from rule_engine import RuleAutomaton
 from abc import abstractmethod
 
 class RowRule:
@@ -13,23 +14,35 @@ class RowRule:
     cls.combos = []
     for stitch in cls.allowed_stitches():
       cls.combos.append([stitch])
+  @classmethod
   def valid_stitch_combinations(cls):
     if cls.combos == None:
       cls.build_valid_stitch_combinations()
     return cls.combos
-  @abstractmethod
+  @classmethod
+  def forbids_adjacent(cls, first_stitch, second_stitch):
+    return False
   def validate(self, new_stitches, partial_row):
-    return all(new_stitch in self.allowed_stitches()
-    for new_stitch in new_stitches) \
-    and (partial_row.current_size() + len(new_stitches)
-    <= partial_row.stitch_count)
+    # new_stitches is a group about to be appended to partial_row, a Row
+    # filled in order; the group must fit and leave the row at a point where
+    # the rule could be satisfied. a row keeps the state of its own rules up
+    # to date as stitches are appended, so for one of them this is the
+    # row's check from that state; any other rule is run over the row
+    if type(self) in partial_row.rules():
+      return partial_row.accepts_next(new_stitches)
+    width = sum(new_stitch.ending_size for new_stitch in new_stitches)
+    if partial_row.current_size() + width > partial_row.stitch_count:
+      return False
+    automaton = RuleAutomaton.compile([type(self)])
+    state = automaton.run([stitch.stitch_enum for stitch in partial_row.stitches()])
+    return automaton.is_accepting(automaton.run(new_stitches, state))
 
 class MaintainStitchCountRowRule(RowRule):
   @classmethod
   def build_valid_stitch_combinations(cls):
-    cls.combos = [[st] for st in list(StitchEnum) if st.is_static_stitch_count()]
-    for decrease in [st for st in list(StitchEnum) if st.is_decrease()]:
-      for increase in [st for st in list(StitchEnum) if st.is_increase()]:
+    cls.combos = [[st] for st in StitchEnum.select(static_stitch_count=True)]
+    for decrease in StitchEnum.select(decrease=True):
+      for increase in StitchEnum.select(increase=True):
         match (decrease.direction, increase.direction):
           case (Direction.RIGHT, Direction.STRAIGHT):
             cls.combos.append([decrease, increase])
@@ -45,31 +58,19 @@ class MaintainStitchCountRowRule(RowRule):
             cls.combos.append([increase, decrease])
   @classmethod
   def allowed_stitches(self):
-    return list(StitchEnum)
-  def validate(self, new_stitches, partial_row):
-    return super().validate(new_stitches, partial_row)
+    return StitchEnum.select()
 
 class NoDoubleIncreasesFromThinAirRowRule(RowRule):
   @classmethod
   def allowed_stitches(self):
-    return list(StitchEnum)
-  def is_non_duplicatable_increase(self,stitch):
-    return stitch.starting_size == 0 or stitch in [StitchEnum.RLI, StitchEnum.LLI]
-  def validate(self, new_stitches, partial_row):
-    if not super().validate(new_stitches, partial_row):
-      return False
-    all_stitches = []
-    if len(partial_row) > 0:
-      all_stitches.append(partial_row[-1])
-    all_stitches.extend(new_stitches)
-    for i in range(1,len(all_stitches)):
-      first_stitch = all_stitches[i-1]
-      second_stitch = all_stitches[i]
-      print("comparing " + str(first_stitch) + " and " + str(second_stitch) + " for double increases")
-      if self.is_non_duplicatable_increase(all_stitches[i-1]) and self.is_non_duplicatable_increase(all_stitches[i]):
-        return False
-    print("done comparing for double increases")
-    return True
+    return StitchEnum.select()
+  non_duplicatable_increases = StitchEnum.select_set(starting_size=0) | {StitchEnum.RLI, StitchEnum.LLI}
+  @classmethod
+  def is_non_duplicatable_increase(cls,stitch):
+    return stitch in cls.non_duplicatable_increases
+  @classmethod
+  def forbids_adjacent(cls, first_stitch, second_stitch):
+    return cls.is_non_duplicatable_increase(first_stitch) and cls.is_non_duplicatable_increase(second_stitch)
 
 class DoubleStitchCountIncreaseRowRule(RowRule):
   @classmethod
@@ -78,39 +79,42 @@ class DoubleStitchCountIncreaseRowRule(RowRule):
     for stitch in cls.allowed_stitches():
       if stitch.is_increase() and stitch.starting_size == 1:
         cls.combos.append([stitch])
-    for stitch_static in [st for st in cls.allowed_stitches() if st.is_static_stitch_count()]:
-      for stitch_increase in [st for st in cls.allowed_stitches() if st.starting_size == 0]:
+    for stitch_static in StitchEnum.select(starting_size_lt=2, static_stitch_count=True):
+      for stitch_increase in StitchEnum.select(starting_size=0):
         cls.combos.extend([[stitch_static,stitch_increase],[stitch_increase,stitch_static]])
   @classmethod
   def allowed_stitches(cls):
-    return [stitch_enum for stitch_enum in list(StitchEnum) if stitch_enum.starting_size < 2]
-  def validate(self, new_stitches, partial_row):
-    return super().validate(self, new_stitches, partial_row) and new_stitches in self.valid_stitch_combinations()
+    return StitchEnum.select(starting_size_lt=2)
 
 class NoIncreasesRowRule(RowRule):
   @classmethod
   def allowed_stitches(self):
-    return [stitch_enum for stitch_enum in list(StitchEnum) if not stitch_enum.is_increase()]
-  def validate(self, new_stitches, partial_row):
-    return super.validate(self, new_stitches, partial_row) and new_stitches in self.valid_stitch_combinations()
+    return StitchEnum.select(increase=False)
 
 class NoDecreasesRowRule(RowRule):
   @classmethod
   def allowed_stitches(cls):
-    return [stitch_enum for stitch_enum in list(StitchEnum) if not stitch_enum.is_decrease()]
-  def validate(self, new_stitches, partial_row):
-    return super.validate(self, new_stitches, partial_row) and new_stitches in self.valid_stitch_combinations()
+    return StitchEnum.select(decrease=False)
 
 class NoCablesRowRule(RowRule):
   @classmethod
   def allowed_stitches(self):
-    return [stitch_enum for stitch_enum in list(StitchEnum) if not stitch_enum.is_cable()]
-  def validate(self, new_stitches, partial_row):
-    return super().validate(new_stitches, partial_row) and new_stitches in self.valid_stitch_combinations()
+    return StitchEnum.select(cable=False)
+
+def row_rules(row_num, is_increase_row):
+  # odd rows (and the cast-on row) are rest rows; increase rows double the
+  # stitch count; the remaining rows are free
+  rules = [NoDoubleIncreasesFromThinAirRowRule]
+  if is_increase_row:
+    rules.extend([NoDecreasesRowRule, NoCablesRowRule, DoubleStitchCountIncreaseRowRule])
+  elif row_num == 0 or row_num % 2 == 1:
+    rules.extend([NoIncreasesRowRule, NoDecreasesRowRule, NoCablesRowRule])
+  return tuple(rules)
 
-for cls in [MaintainStitchCountRowRule, NoDoubleIncreasesFromThinAirRowRule, DoubleStitchCountIncreaseRowRule, NoIncreasesRowRule, NoDecreasesRowRule, NoCablesRowRule]:
-  rule = cls()
-  print(rule.valid_stitch_combinations())
-for cls in [MaintainStitchCountRowRule, NoDoubleIncreasesFromThinAirRowRule, DoubleStitchCountIncreaseRowRule, NoIncreasesRowRule, NoDecreasesRowRule, NoCablesRowRule]:
-  rule = cls()
-  print(rule.valid_stitch_combinations()) #ensure everything stayed the same...
+if __name__ == "__main__":
+  for cls in [MaintainStitchCountRowRule, NoDoubleIncreasesFromThinAirRowRule, DoubleStitchCountIncreaseRowRule, NoIncreasesRowRule, NoDecreasesRowRule, NoCablesRowRule]:
+    rule = cls()
+    print(rule.valid_stitch_combinations())
+  for cls in [MaintainStitchCountRowRule, NoDoubleIncreasesFromThinAirRowRule, DoubleStitchCountIncreaseRowRule, NoIncreasesRowRule, NoDecreasesRowRule, NoCablesRowRule]:
+    rule = cls()
+    print(rule.valid_stitch_combinations()) #ensure everything stayed the same...
@@ -0,0 +1,289 @@
+"""Searching for random charts that meet given requirements.
+
+Generating whole charts and throwing away the ones that miss a requirement
+wastes almost all of the work once the requirement is rare. search() builds
+a chart row by row instead. After every stitch it asks each constraint
+whether the chart placed so far can still meet it. A row that fails is
+abandoned on the spot and drawn again, and a row that keeps failing sends
+the search back to redraw the row before it.
+
+A constraint is any callable taking a SearchState and returning False once
+the partial chart can no longer be completed to meet it. Constraints should
+be optimistic while room is left, and exact when the row or chart is full.
+The last call for each row comes when that row is full, and the last call
+overall comes when the whole chart is. MinimumShare, BalancedLeans and
+NoneBelow cover the usual requirements. A score is a callable taking the
+finished SearchState and returning a number, higher is better.
+
+A constraint may also name favoured_stitches, stitches it needs more of
+than a uniform chart has. A row that keeps failing is then drawn with those
+stitches weighted more and more heavily (see BIAS_WEIGHTS), so a rare
+target such as a high share of lace is reached by steering the draws rather
+than by waiting for uniform draws to hit it.
+
+search_best() runs several searches with seeds derived from one master
+seed, in a process pool, and keeps the best scoring chart. Constraints and
+scores sent to worker processes must be picklable, so use module level
+functions or constraint objects rather than lambdas there.
+"""
+from batch import chart_seed
+from circular_chart import CircularChart, row_completer, stitch_counts_for
+from concurrent.futures import ProcessPoolExecutor
+from constraint_table import ConstraintTable
+from row import NUM_STITCH_CODES
+from stats import LEFT_CODES, RIGHT_CODES
+from stitch import StitchEnum
+from itertools import accumulate
+import os
+import random
+
+LACE_STITCHES = (StitchEnum.YO,) + tuple(StitchEnum.select(decrease=True))
+CABLE_STITCHES = tuple(StitchEnum.select(cable=True))
+LACE_CODES = tuple(stitch.code() for stitch in LACE_STITCHES)
+# weight of favoured stitches as a row's attempts run out, from uniform up
+BIAS_WEIGHTS = (1, 2, 4, 8, 16, 64)
+
+class _CodeCount:
+    # number of stitches of a group with the given codes, as a hashable
+    # group value for RowCompleter.best_total
+    __slots__ = ('codes',)
+    def __init__(self, codes):
+        self.codes = frozenset(codes)
+    def __hash__(self):
+        return hash(self.codes)
+    def __eq__(self, other):
+        return isinstance(other, _CodeCount) and self.codes == other.codes
+    def __call__(self, group):
+        return sum(1 for stitch in group if stitch.code() in self.codes)
+
+def _fewer_stitches(group):
+    return -len(group)
+
+class SearchState:
+    """The chart placed so far, as constraints and scores see it.
+
+    rows holds the stitch codes of the finished rows and row those of the
+    row being placed, row_num. Counts are kept per stitch code as stitches
+    are placed, so constraints can check them without rescanning the chart.
+    room is what is left of the current row, remaining what is left of the
+    whole chart, both in stitches of the row being worked. table is the
+    ConstraintTable the chart is generated under.
+    """
+    __slots__ = ('stitch_counts', 'num_rows', 'table', 'rows', 'row', 'row_counts', 'totals',
+                 'room', 'remaining', '_finished_counts', '_bounds')
+
+    def __init__(self, stitch_counts, table):
+        self.stitch_counts = tuple(stitch_counts)
+        self.table = table
+        self._bounds = {}
+        self.num_rows = len(self.stitch_counts)
+        self.rows = []
+        self.row = bytearray()
+        self.row_counts = [0] * NUM_STITCH_CODES
+        self.totals = [0] * NUM_STITCH_CODES
+        self.room = self.stitch_counts[0] if self.stitch_counts else 0
+        self.remaining = sum(self.stitch_counts)
+        self._finished_counts = []
+
+    @property
+    def row_num(self):
+        return len(self.rows)
+
+    def count(self, codes):
+        """Number of stitches with the given codes in the whole chart so far."""
+        return sum(self.totals[code] for code in codes)
+
+    def row_count(self, codes):
+        """Number of stitches with the given codes in the current row so far."""
+        return sum(self.row_counts[code] for code in codes)
+
+    def num_stitches(self):
+        return sum(len(codes) for codes in self.rows) + len(self.row)
+
+    def row_bounds(self, value):
+        """(best, after): the largest total of value(group) any whole row can have, per row, and its sum over the later rows.
+
+        value is as for RowCompleter.best_total. Rows are taken on their own,
+        whatever stitch ends the row before, so the bounds are optimistic.
+        """
+        if value not in self._bounds:
+            best = []
+            for row_num, stitch_count in enumerate(self.stitch_counts):
+                completer = row_completer(self.stitch_counts, row_num, self.table)
+                best.append(max(completer.best_total(stitch_count, (previous_restricted, completer.automaton.start),
+                                                     value) for previous_restricted in (False, True)))
+            after = list(accumulate(reversed(best[1:]), initial=0))[::-1]
+            self._bounds[value] = (best, after)
+        return self._bounds[value]
+
+    def payload(self, starting_stitch_count):
+        """The finished chart as a CircularChart payload."""
+        assert self.row_num == self.num_rows, "the chart is not finished"
+        return (self.num_rows, starting_stitch_count, tuple(self.rows))
+
+    def _place(self, stitch_enum):
+        code = stitch_enum.code()
+        self.row.append(code)
+        self.row_counts[code] += 1
+        self.totals[code] += 1
+        self.room -= stitch_enum.ending_size
+        self.remaining -= stitch_enum.ending_size
+
+    def _finish_row(self):
+        self.rows.append(bytes(self.row))
+        self._finished_counts.append(self.row_counts)
+        self.row = bytearray()
+        self.row_counts = [0] * NUM_STITCH_CODES
+        if self.row_num < self.num_rows:
+            self.room = self.stitch_counts[self.row_num]
+
+    def _discard_row(self):
+        # forget the stitches placed so far in the current row
+        for code, count in enumerate(self.row_counts):
+            self.totals[code] -= count
+        self.remaining += self.stitch_counts[self.row_num] - self.room
+        self.row = bytearray()
+        self.row_counts = [0] * NUM_STITCH_CODES
+        self.room = self.stitch_counts[self.row_num]
+
+    def _reopen_row(self):
+        # drop the last finished row, so that it is drawn again
+        self._discard_row()
+        self.rows.pop()
+        for code, count in enumerate(self._finished_counts.pop()):
+            self.totals[code] -= count
+        self.room = self.stitch_counts[self.row_num]
+        self.remaining += self.room
+
+class MinimumShare:
+    """At least share of all the chart's stitches are among stitches."""
+    def __init__(self, stitches, share):
+        self.favoured_stitches = tuple(stitches)
+        self.codes = tuple(stitch.code() for stitch in stitches)
+        self.share = share
+        self._count = _CodeCount(self.codes)
+
+    def __call__(self, state):
+        matching, placed = state.count(self.codes), state.num_stitches()
+        row_num = state.row_num
+        if row_num == state.num_rows:
+            return matching >= self.share * placed
+        # best case: the rest of this row and every later row hold as many of
+        # the stitches as their rules allow, in as few stitches as they allow
+        most, most_after = state.row_bounds(self._count)
+        fewest, fewest_after = state.row_bounds(_fewer_stitches)
+        more = min(state.room, most[row_num] - state.row_count(self.codes)) + most_after[row_num]
+        at_least = max(0, -fewest[row_num] - len(state.row)) - fewest_after[row_num]
+        return matching + more >= self.share * (placed + at_least)
+
+class BalancedLeans:
+    """Every row has as many right leaning stitches as left ones, give or take tolerance."""
+    def __init__(self, tolerance=0):
+        self.tolerance = tolerance
+
+    def __call__(self, state):
+        return abs(state.row_count(RIGHT_CODES) - state.row_count(LEFT_CODES)) <= self.tolerance + state.room
+
+class NoneBelow:
+    """None of stitches appear in the rows below row_num (e.g. no cables in the first rows)."""
+    def __init__(self, stitches, row_num):
+        self.codes = tuple(stitch.code() for stitch in stitches)
+        self.row_num = row_num
+
+    def __call__(self, state):
+        return state.row_num >= self.row_num or state.row_count(self.codes) == 0
+
+def lace_share(state):
+    """Share of the chart's stitches that are yarn overs or decreases; a score."""
+    num_stitches = state.num_stitches()
+    return state.count(LACE_CODES) / num_stitches if num_stitches else 0.0
+
+def search_state(num_rows, starting_stitch_count, constraints=(), rng=random, row_attempts=32,
+                 max_attempts=100000, restricted_stitches=None):
+    """The finished SearchState of a chart meeting every constraint, or None if none was found.
+
+    Each row is drawn at most row_attempts times before the search backs
+    up to the row before it, and the search gives up after max_attempts
+    row draws in all, or when the first row runs out of attempts. Later
+    attempts at a row weight the constraints' favoured stitches by the
+    later BIAS_WEIGHTS.
+    """
+    if restricted_stitches is None:
+        restricted_stitches = CircularChart.stitches_that_may_not_appear_next_to_each_other
+    table = ConstraintTable.compile(restricted_stitches)
+    favoured = {stitch for constraint in constraints for stitch in getattr(constraint, 'favoured_stitches', ())}
+    if favoured:
+        tables = [table] + [ConstraintTable.compile(restricted_stitches, {stitch: weight for stitch in favoured})
+                            for weight in BIAS_WEIGHTS[1:]]
+    else:
+        tables = [table]
+    restricted_codes = {stitch.code() for stitch in table.restricted_stitches}
+    stitch_counts = stitch_counts_for(num_rows, starting_stitch_count)
+    state = SearchState(stitch_counts, table)
+    attempts = [0] * num_rows
+    for _ in range(max_attempts):
+        if state.row_num == num_rows:
+            return state
+        row_num = state.row_num
+        if attempts[row_num] == row_attempts:
+            if row_num == 0:
+                return None
+            attempts[row_num] = 0
+            state._reopen_row()
+            continue
+        bias = min(attempts[row_num] * len(tables) // row_attempts, len(tables) - 1)
+        attempts[row_num] += 1
+        start_restricted = row_num > 0 and state.rows[-1][-1] in restricted_codes
+        met = True
+        for _, stitch_enum in CircularChart.random_placements(stitch_counts, tables[bias], rng, start_row=row_num,
+                                                               stop_row=row_num + 1,
+                                                               start_restricted=start_restricted):
+            state._place(stitch_enum)
+            if not all(constraint(state) for constraint in constraints):
+                met = False
+                break
+        if met:
+            state._finish_row()
+        else:
+            state._discard_row()
+    return state if state.row_num == num_rows else None
+
+def search(num_rows, starting_stitch_count, constraints=(), seed=None, row_attempts=32, max_attempts=100000,
+           restricted_stitches=None):
+    """Payload of a random chart meeting every constraint (see search_state), or None."""
+    state = search_state(num_rows, starting_stitch_count, constraints, random.Random(seed), row_attempts,
+                         max_attempts, restricted_stitches)
+    return None if state is None else state.payload(starting_stitch_count)
+
+def _search_scored(num_rows, starting_stitch_count, constraints, score, seed, index, row_attempts, max_attempts,
+                   restricted_stitches):
+    state = search_state(num_rows, starting_stitch_count, constraints, random.Random(chart_seed(seed, index)),
+                         row_attempts, max_attempts, restricted_stitches)
+    if state is None:
+        return None
+    return score(state), state.payload(starting_stitch_count)
+
+def search_best(num_rows, starting_stitch_count, constraints=(), score=lace_share, count=8, seed=None, workers=None,
+                row_attempts=32, max_attempts=100000, restricted_stitches=None):
+    """(score, payload) of the best of count searched charts, or None if every search failed.
+
+    Search number i uses a random.Random derived from seed and i, as in
+    batch.generate_many, so the result does not depend on the number of
+    workers. Ties go to the lower numbered search.
+    """
+    if seed is None:
+        seed = random.randrange(2**63)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    tasks = [(num_rows, starting_stitch_count, tuple(constraints), score, seed, index, row_attempts, max_attempts,
+              restricted_stitches) for index in range(count)]
+    if workers <= 1 or count <= 1:
+        results = [_search_scored(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, count)) as executor:
+            results = list(executor.map(_search_scored, *zip(*tasks)))
+    best = None
+    for result in results:
+        if result is not None and (best is None or result[0] > best[0]):
+            best = result
+    return best
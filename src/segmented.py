@@ -0,0 +1,79 @@
+"""Generating one large chart in parallel, a block of rows per process.
+
+Rows are always filled exactly (stitch groups never run into the next
+row), so the only thing one row passes to the next is whether its last
+stitch is one of the restricted stitches that may not sit next to each
+other. generate_segmented cuts the chart at row boundaries into segments of
+about equal stitch counts (so the wide rows after each doubling are spread
+over several segments), and starts every segment as if after a restricted
+stitch. Its first stitch is then allowed whatever the previous segment ends
+with, so segments are generated independently and simply concatenated;
+the joins are checked as they are stitched back together.
+
+Each segment has its own random.Random seeded from the master seed and its
+index, and the segments depend only on the schedule and the segments
+argument, so the chart for a given seed is the same for any number of
+workers.
+"""
+from batch import chart_seed
+from circular_chart import CircularChart, stitch_counts_for
+from constraint_table import ConstraintTable
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+
+def plan_segments(stitch_counts, segments):
+    """Split rows into at most segments contiguous (start_row, stop_row) ranges of similar size."""
+    total = sum(stitch_counts)
+    target = total / max(1, segments)
+    plan = []
+    start_row = 0
+    filled = 0
+    for row_num, stitch_count in enumerate(stitch_counts):
+        filled += stitch_count
+        # cut once this segment's share of the total is reached
+        if filled >= target * (len(plan) + 1) or row_num == len(stitch_counts) - 1:
+            plan.append((start_row, row_num + 1))
+            start_row = row_num + 1
+    return plan
+
+def generate_segment(num_rows, starting_stitch_count, restricted_stitches, seed, index, start_row, stop_row):
+    """Stitch codes of rows start_row to stop_row, one bytes per row."""
+    stitch_counts = stitch_counts_for(num_rows, starting_stitch_count)
+    table = ConstraintTable.compile(restricted_stitches)
+    rng = random.Random(chart_seed(seed, index))
+    rows = [bytearray() for _ in range(start_row, stop_row)]
+    for coords, stitch_enum in CircularChart.random_placements(stitch_counts, table, rng, start_row=start_row,
+                                                               stop_row=stop_row, start_restricted=start_row > 0):
+        rows[coords.row_num - start_row].append(stitch_enum.code())
+    return [bytes(row) for row in rows]
+
+def generate_segmented(num_rows, starting_stitch_count, seed=None, workers=None, segments=16,
+                       restricted_stitches=None):
+    """Payload of one random chart (see CircularChart.to_payload), generated a segment per task."""
+    if seed is None:
+        seed = random.randrange(2**63)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if restricted_stitches is None:
+        restricted_stitches = CircularChart.stitches_that_may_not_appear_next_to_each_other
+    restricted_stitches = frozenset(restricted_stitches)
+    plan = plan_segments(stitch_counts_for(num_rows, starting_stitch_count), segments)
+    tasks = [(num_rows, starting_stitch_count, restricted_stitches, seed, index, start_row, stop_row)
+             for index, (start_row, stop_row) in enumerate(plan)]
+    if workers <= 1 or len(tasks) <= 1:
+        parts = [generate_segment(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            parts = list(executor.map(generate_segment, *zip(*tasks)))
+    rows = []
+    for part in parts:
+        if rows:
+            _check_join(rows[-1], part[0], restricted_stitches)
+        rows.extend(part)
+    return (num_rows, starting_stitch_count, tuple(rows))
+
+def _check_join(last_row, first_row, restricted_stitches):
+    restricted_codes = {stitch.code() for stitch in restricted_stitches}
+    assert not (last_row[-1] in restricted_codes and first_row[0] in restricted_codes), \
+        "segments joined two restricted stitches"
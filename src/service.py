@@ -0,0 +1,349 @@
+"""Local HTTP/JSON service that keeps chart generation warm.
+
+    python service.py serve --port 8765 --workers 2
+    python service.py load --port 8765 --concurrency 16 --requests 500
+
+Endpoints (JSON bodies):
+
+    POST /generate  {"num_rows", "starting_stitch_count", "seed"?}
+                    -> {"chart": chart}
+    POST /render    {"chart" or the /generate fields, "format": "text"|"svg"|"png"}
+                    -> the rendering, as text/plain, image/svg+xml or image/png
+    POST /validate  {"chart"} -> {"valid", "rows": [{"row", "complete", "rules"}]}
+    GET  /health    -> request counters
+
+A chart is {"num_rows", "starting_stitch_count", "rows": [[stitch, ...], ...]}
+with stitches by abbreviation, e.g. "K2TOG". Work runs in a bounded process
+pool; when max_pending requests are already queued or running new ones get
+503, and requests that take longer than the timeout get 504. A request stays
+pending until its worker has actually finished, even after it timed out, and
+charts of more than max_stitches stitches are refused with 400.
+"""
+from circular_chart import CircularChart, stitch_counts_for
+from stitch import StitchEnum
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import argparse
+import asyncio
+import io
+import json
+import random
+import sys
+import time
+
+_STITCHES_BY_NAME = {str(stitch): stitch for stitch in StitchEnum}
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+            504: "Gateway Timeout"}
+MAX_BODY = 16 * 1024 * 1024
+MAX_IMAGE_SIZE = 4096
+
+class RequestError(Exception):
+    # args hold both fields so the error survives pickling out of a worker
+    def __init__(self, status, message):
+        super().__init__(status, message)
+        self.status = status
+        self.message = message
+    def __str__(self):
+        return self.message
+
+def chart_to_json(payload):
+    num_rows, starting_stitch_count, rows = payload
+    return {"num_rows": num_rows, "starting_stitch_count": starting_stitch_count,
+            "rows": [[str(StitchEnum.from_code(code)) for code in codes] for codes in rows]}
+
+def _check_schedule(num_rows, starting_stitch_count):
+    if not 0 < num_rows <= 32 or not 0 < starting_stitch_count <= 4096:
+        raise RequestError(400, "num_rows must be 1-32 and starting_stitch_count 1-4096")
+
+def chart_from_json(chart):
+    try:
+        num_rows, starting_stitch_count = int(chart["num_rows"]), int(chart["starting_stitch_count"])
+    except (KeyError, TypeError, ValueError) as error:
+        raise RequestError(400, f"malformed chart: {error!r}")
+    _check_schedule(num_rows, starting_stitch_count)
+    try:
+        rows = tuple(bytes(_STITCHES_BY_NAME[name.upper()].code() for name in row) for row in chart["rows"])
+    except (KeyError, TypeError, ValueError, AttributeError) as error:
+        raise RequestError(400, f"malformed chart: {error!r}")
+    return (num_rows, starting_stitch_count, rows)
+
+# the functions below run in the worker processes
+
+def _generate(num_rows, starting_stitch_count, seed):
+    chart = CircularChart(num_rows, starting_stitch_count)
+    chart.generate_random_chart(rng=random.Random(seed))
+    return chart.to_payload()
+
+def _payload_for(request):
+    # request is as prepared by ChartService.dispatch
+    if "chart" in request:
+        return request["chart"]
+    return _generate(*request["params"])
+
+def _render(request):
+    chart = CircularChart.from_payload(_payload_for(request))
+    format = request.get("format", "text")
+    if format == "text":
+        return "text/plain; charset=utf-8", chart.chart_print_string().encode()
+    # render.py needs NumPy, so only load it when asked for an image
+    from render import write_png, write_svg
+    size = request["size"]
+    if format == "svg":
+        output = io.StringIO()
+        write_svg(chart, output, size=size)
+        return "image/svg+xml", output.getvalue().encode()
+    if format == "png":
+        output = io.BytesIO()
+        write_png(chart, output, size=size)
+        return "image/png", output.getvalue()
+    raise RequestError(400, f"unknown format: {format}")
+
+def _validate(request):
+    chart = CircularChart.from_payload(_payload_for(request))
+    rows = [{"row": row_num, "complete": chart[row_num].current_size() == chart[row_num].stitch_count,
+             "rules": chart[row_num].validate()} for row_num in range(chart.num_rows)]
+    return {"valid": all(row["complete"] and row["rules"] for row in rows), "rows": rows}
+
+def _generation_params(request):
+    try:
+        num_rows = int(request["num_rows"])
+        starting_stitch_count = int(request["starting_stitch_count"])
+        seed = request.get("seed")
+    except (KeyError, TypeError, ValueError) as error:
+        raise RequestError(400, f"bad generation parameters: {error!r}")
+    _check_schedule(num_rows, starting_stitch_count)
+    # bool is an int too, but true is not a seed anyone meant
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+        raise RequestError(400, "seed must be an integer")
+    return num_rows, starting_stitch_count, random.randrange(2**63) if seed is None else seed
+
+def _render_size(request):
+    try:
+        size = int(request.get("size", 800))
+    except (TypeError, ValueError) as error:
+        raise RequestError(400, f"bad size: {error!r}")
+    if not 0 < size <= MAX_IMAGE_SIZE:
+        raise RequestError(400, f"size must be 1-{MAX_IMAGE_SIZE}")
+    return size
+
+class ChartService:
+    def __init__(self, workers=2, max_pending=64, timeout=30.0, max_stitches=100000):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_stitches = max_stitches
+        self.pending = 0
+        self.counters = {"served": 0, "rejected": 0, "timed_out": 0, "failed": 0}
+
+    async def submit(self, function, *args):
+        # backpressure: refuse rather than queue without bound
+        if self.pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise RequestError(503, "too many pending requests")
+        loop = asyncio.get_running_loop()
+        try:
+            job = self.executor.submit(function, *args)
+        except BrokenProcessPool:
+            self.__replace_executor()
+            raise
+        # the slot is held until the worker is done with the job, not just
+        # until the request gives up on it, so that timed out jobs still
+        # count against max_pending while they occupy a worker
+        self.pending += 1
+        job.add_done_callback(lambda _: loop.call_soon_threadsafe(self.__release))
+        try:
+            # a timeout cancels the job if it has not started yet
+            return await asyncio.wait_for(asyncio.wrap_future(job), self.timeout)
+        except asyncio.TimeoutError:
+            self.counters["timed_out"] += 1
+            raise RequestError(504, f"request took longer than {self.timeout}s")
+        except BrokenProcessPool:
+            self.__replace_executor()
+            raise
+
+    def __release(self):
+        self.pending -= 1
+
+    def __replace_executor(self):
+        # a worker died; replace the pool so later requests still run
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def check_size(self, num_rows, starting_stitch_count):
+        if sum(stitch_counts_for(num_rows, starting_stitch_count)) > self.max_stitches:
+            raise RequestError(400, f"charts are limited to {self.max_stitches} stitches")
+
+    async def dispatch(self, method, path, request):
+        if path == "/health":
+            return 200, "application/json", json.dumps({**self.counters, "pending": self.pending}).encode()
+        if path not in ("/generate", "/render", "/validate"):
+            raise RequestError(404, f"no such endpoint: {path}")
+        if method != "POST":
+            raise RequestError(405, f"{path} takes POST")
+        if path == "/generate":
+            params = _generation_params(request)
+            self.check_size(*params[:2])
+            payload = await self.submit(_generate, *params)
+            return 200, "application/json", json.dumps({"chart": chart_to_json(payload)}).encode()
+        # parse here so malformed input is rejected without using a worker
+        if "chart" in request:
+            request = {**request, "chart": chart_from_json(request["chart"])}
+            self.check_size(*request["chart"][:2])
+        else:
+            request = {**request, "params": _generation_params(request)}
+            self.check_size(*request["params"][:2])
+        if path == "/render":
+            request["size"] = _render_size(request)
+            content_type, body = await self.submit(_render, request)
+            return 200, content_type, body
+        return 200, "application/json", json.dumps(await self.submit(_validate, request)).encode()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), self.timeout)
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, "application/json", b'{"error": "body too large"}', False)
+                    break
+                body = await asyncio.wait_for(reader.readexactly(length), self.timeout) if length else b""
+                status, content_type, response = await self.process(method, path, body)
+                await self.respond(writer, status, content_type, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            # including clients too slow to send their headers or body
+            pass
+        finally:
+            writer.close()
+
+    async def process(self, method, path, body):
+        try:
+            request = json.loads(body) if body else {}
+            if not isinstance(request, dict):
+                raise RequestError(400, "request body must be a JSON object")
+            status, content_type, response = await self.dispatch(method, path, request)
+            self.counters["served"] += 1
+            return status, content_type, response
+        except json.JSONDecodeError as error:
+            status, message = 400, f"invalid JSON: {error}"
+        except RequestError as error:
+            status, message = error.status, str(error)
+        except AssertionError as error:
+            # the chart code reports impossible charts with asserts
+            status, message = 400, str(error) or "invalid chart"
+        except Exception as error:
+            self.counters["failed"] += 1
+            status, message = 500, repr(error)
+        return status, "application/json", json.dumps({"error": message}).encode()
+
+    async def respond(self, writer, status, content_type, body, keep_alive):
+        head = (f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n")
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def serve(self, host="127.0.0.1", port=8765, ready=None):
+        server = await asyncio.start_server(self.handle, host, port)
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+async def _request(reader, writer, method, path, body):
+    data = json.dumps(body).encode()
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    return status, await reader.readexactly(length)
+
+async def load_test(host, port, path="/generate", body=None, concurrency=16, requests=500):
+    """Send requests from concurrency keep-alive clients; returns throughput and latency percentiles."""
+    if body is None:
+        body = {"num_rows": 12, "starting_stitch_count": 8}
+    latencies = []
+    statuses = {}
+    remaining = iter(range(requests))
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for _ in remaining:
+                start = time.perf_counter()
+                status, _ = await _request(reader, writer, "POST", path, body)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+    return {"requests": len(latencies), "seconds": elapsed, "throughput": len(latencies) / elapsed,
+            "p50_ms": percentile(0.50) * 1000, "p99_ms": percentile(0.99) * 1000, "statuses": statuses}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run the service")
+    load_parser = commands.add_parser("load", help="load-test a running service")
+    for command_parser in (serve_parser, load_parser):
+        command_parser.add_argument("--host", default="127.0.0.1")
+        command_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--workers", type=int, default=2)
+    serve_parser.add_argument("--max-pending", type=int, default=64)
+    serve_parser.add_argument("--timeout", type=float, default=30.0)
+    serve_parser.add_argument("--max-stitches", type=int, default=100000)
+    load_parser.add_argument("--path", default="/generate")
+    load_parser.add_argument("--body", type=json.loads, default=None, help="JSON request body")
+    load_parser.add_argument("--concurrency", type=int, default=16)
+    load_parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        service = ChartService(args.workers, args.max_pending, args.timeout, args.max_stitches)
+        try:
+            asyncio.run(service.serve(args.host, args.port,
+                                      ready=lambda server: print(f"serving on {args.host}:{args.port}")))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.close()
+        return 0
+    results = asyncio.run(load_test(args.host, args.port, args.path, args.body, args.concurrency, args.requests))
+    print(f"{results['requests']} requests in {results['seconds']:.2f}s: {results['throughput']:.1f} req/s, "
+          f"p50 {results['p50_ms']:.1f}ms, p99 {results['p99_ms']:.1f}ms, statuses {results['statuses']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
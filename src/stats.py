@@ -0,0 +1,86 @@
+from stitch import StitchEnum, Direction
+from collections import Counter
+
+STITCHES = tuple(StitchEnum)
+INCREASE_CODES = tuple(stitch.code() for stitch in StitchEnum.select(increase=True))
+DECREASE_CODES = tuple(stitch.code() for stitch in StitchEnum.select(decrease=True))
+LEFT_CODES = tuple(stitch.code() for stitch in StitchEnum.select(direction=Direction.LEFT))
+RIGHT_CODES = tuple(stitch.code() for stitch in StitchEnum.select(direction=Direction.RIGHT))
+
+# yarn used by one of each stitch, in lengths of a plain knit stitch: one per
+# loop made, with extra for a bobble's worked-and-turned loops
+DEFAULT_YARN_WEIGHTS = {stitch: float(stitch.ending_size) for stitch in StitchEnum}
+DEFAULT_YARN_WEIGHTS[StitchEnum.BOBBLE] = 5.0
+
+class ChartStats:
+    """Stitch statistics for a chart.
+
+    A chart's stats are read from counts that Row.__setitem__ keeps up to
+    date, so every query is a pass over the stitch catalogue rather than the
+    chart. row_num=None means the whole chart. yarn_weights maps stitches to
+    their yarn use, defaulting to DEFAULT_YARN_WEIGHTS for stitches it omits.
+    """
+    def __init__(self, chart, yarn_weights=None):
+        self.num_rows = chart.num_rows
+        self._rows = chart
+        self._totals = chart._stitch_totals
+        self.set_yarn_weights(yarn_weights)
+
+    @classmethod
+    def from_payload(cls, payload, yarn_weights=None):
+        """Stats for a chart payload (see CircularChart.to_payload) without building the chart."""
+        stats = cls.__new__(cls)
+        num_rows, _, rows = payload
+        stats.num_rows = num_rows
+        stats._rows = [Counter(codes) for codes in rows]
+        stats._totals = sum(stats._rows, Counter())
+        stats.set_yarn_weights(yarn_weights)
+        return stats
+
+    def set_yarn_weights(self, yarn_weights):
+        weights = dict(DEFAULT_YARN_WEIGHTS)
+        if yarn_weights is not None:
+            weights.update(yarn_weights)
+        self.yarn_weights = tuple(weights[stitch] for stitch in STITCHES)
+
+    def _counts(self, row_num):
+        if row_num is None:
+            return self._totals
+        row = self._rows[row_num]
+        # chart rows keep a code-indexed list, payload rows a Counter
+        return row if isinstance(row, Counter) else row.stitch_counts()
+
+    def count(self, stitch, row_num=None):
+        return self._counts(row_num)[stitch.code()]
+
+    def histogram(self, row_num=None):
+        """{StitchEnum: count} for the stitches that appear."""
+        counts = self._counts(row_num)
+        return {stitch: counts[code] for code, stitch in enumerate(STITCHES) if counts[code]}
+
+    def num_stitches(self, row_num=None):
+        counts = self._counts(row_num)
+        return sum(counts[code] for code in range(len(STITCHES)))
+
+    def increases(self, row_num=None):
+        counts = self._counts(row_num)
+        return sum(counts[code] for code in INCREASE_CODES)
+
+    def decreases(self, row_num=None):
+        counts = self._counts(row_num)
+        return sum(counts[code] for code in DECREASE_CODES)
+
+    def row_increases(self):
+        return [self.increases(row_num) for row_num in range(self.num_rows)]
+
+    def row_decreases(self):
+        return [self.decreases(row_num) for row_num in range(self.num_rows)]
+
+    def lean_balance(self, row_num=None):
+        """Right-leaning minus left-leaning stitches; negative leans left."""
+        counts = self._counts(row_num)
+        return sum(counts[code] for code in RIGHT_CODES) - sum(counts[code] for code in LEFT_CODES)
+
+    def yarn_usage(self, row_num=None):
+        counts = self._counts(row_num)
+        return sum(counts[code] * weight for code, weight in enumerate(self.yarn_weights) if weight)
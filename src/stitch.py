@@ -1,4 +1,5 @@
 from enum import Enum, auto
+import operator
 
 class Direction(Enum):
     LEFT = auto()
@@ -78,6 +79,14 @@ class StitchEnum(StitchDefinition, Enum):
     def name(self):
         return self.abbreviation.upper()
 
+    def code(self):
+        # position in declaration order; used by compact chart encodings
+        return _STITCH_CODES[self]
+
+    @classmethod
+    def from_code(cls, code):
+        return _STITCHES_BY_CODE[code]
+
     def is_increase(self):
         return self.starting_size < self.ending_size
 
@@ -105,3 +114,124 @@ class StitchEnum(StitchDefinition, Enum):
 
     def is_allowed_on_random_generation(self):
         return (self.starting_size < 3 and self.ending_size < 3) or self in {StitchEnum.CDD, StitchEnum.S2KP}
+
+    @classmethod
+    def index(cls):
+        return _INDEX
+
+    @classmethod
+    def select(cls, **criteria):
+        """Stitches matching criteria, in declaration order; see StitchIndex.mask."""
+        return _INDEX.select(**criteria)
+
+    @classmethod
+    def select_set(cls, **criteria):
+        return _INDEX.select_set(**criteria)
+
+_STITCHES_BY_CODE = tuple(StitchEnum)
+_STITCH_CODES = {stitch: code for code, stitch in enumerate(_STITCHES_BY_CODE)}
+
+# attributes a StitchIndex can be queried on, computed from the raw sizes so
+# plain StitchDefinitions index the same way as StitchEnum members
+_FIELDS = {
+    'starting_size': lambda stitch: stitch.starting_size,
+    'ending_size': lambda stitch: stitch.ending_size,
+    'direction': lambda stitch: stitch.direction,
+    'increase': lambda stitch: stitch.starting_size < stitch.ending_size,
+    'decrease': lambda stitch: stitch.ending_size < stitch.starting_size,
+    'static_stitch_count': lambda stitch: stitch.starting_size == stitch.ending_size,
+    'cable': lambda stitch: stitch.starting_size > 1 and stitch.starting_size == stitch.ending_size,
+    'increased_stitch_count': lambda stitch: max(stitch.ending_size - stitch.starting_size, 0),
+    'decreased_stitch_count': lambda stitch: min(stitch.ending_size - stitch.starting_size, 0),
+}
+
+_OPERATORS = {
+    'not': operator.ne,
+    'in': lambda value, operand: value in operand,
+    'not_in': lambda value, operand: value not in operand,
+    'lt': operator.lt,
+    'le': operator.le,
+    'gt': operator.gt,
+    'ge': operator.ge,
+}
+
+class StitchIndex:
+    """Bitmask index over a stitch catalogue.
+
+    Each stitch gets one bit (its position in the catalogue) and every value
+    of every attribute in _FIELDS maps to the mask of stitches having it, so
+    a query is a few integer ANDs. Results are cached as tuples in catalogue
+    order and as frozensets.
+    """
+    def __init__(self, stitches):
+        self.catalogue = tuple(stitches)
+        self.all = (1 << len(self.catalogue)) - 1
+        self.__bits = {stitch: 1 << i for i, stitch in enumerate(self.catalogue)}
+        self.__values = {field: {} for field in _FIELDS}
+        for stitch, bit in self.__bits.items():
+            for field, value_of in _FIELDS.items():
+                value = value_of(stitch)
+                self.__values[field][value] = self.__values[field].get(value, 0) | bit
+        self.__masks = {}
+        self.__tuples = {}
+        self.__sets = {}
+
+    def __len__(self):
+        return len(self.catalogue)
+
+    def bit(self, stitch):
+        return self.__bits[stitch]
+
+    def mask_of(self, stitches):
+        mask = 0
+        for stitch in stitches:
+            mask |= self.__bits[stitch]
+        return mask
+
+    def mask(self, **criteria):
+        """Mask of the stitches matching every criterion.
+
+        Keys are an attribute from _FIELDS, optionally with a suffix from
+        _OPERATORS: select(starting_size=0, direction_not=Direction.LEFT),
+        select(increased_stitch_count_lt=2), select(direction_in={...}).
+        """
+        mask = self.all
+        for key, operand in criteria.items():
+            mask &= self.__criterion_mask(key, operand)
+        return mask
+
+    def __criterion_mask(self, key, operand):
+        if isinstance(operand, (set, list, tuple)):
+            operand = frozenset(operand)
+        cache_key = (key, operand)
+        if cache_key not in self.__masks:
+            field, test = key, operator.eq
+            for suffix, suffix_test in _OPERATORS.items():
+                if key.endswith('_' + suffix) and key[:-len(suffix) - 1] in _FIELDS:
+                    field, test = key[:-len(suffix) - 1], suffix_test
+                    break
+            assert field in _FIELDS, f"unknown stitch criterion: {key}"
+            mask = 0
+            for value, value_mask in self.__values[field].items():
+                if test(value, operand):
+                    mask |= value_mask
+            self.__masks[cache_key] = mask
+        return self.__masks[cache_key]
+
+    def stitches(self, mask):
+        if mask not in self.__tuples:
+            self.__tuples[mask] = tuple(stitch for stitch in self.catalogue if self.__bits[stitch] & mask)
+        return self.__tuples[mask]
+
+    def stitch_set(self, mask):
+        if mask not in self.__sets:
+            self.__sets[mask] = frozenset(self.stitches(mask))
+        return self.__sets[mask]
+
+    def select(self, **criteria):
+        return self.stitches(self.mask(**criteria))
+
+    def select_set(self, **criteria):
+        return self.stitch_set(self.mask(**criteria))
+
+_INDEX = StitchIndex(StitchEnum)
@@ -0,0 +1,54 @@
+from circular_chart import CircularChart, stitch_counts_for
+from constraint_table import ConstraintTable
+from events import EventKind, GenerationEvent
+import random
+import sys
+
+class RowRecord:
+    """A finished row as emitted by generate_rows: its stitches in order with their start slots."""
+    __slots__ = ('row_num', 'stitch_count', 'stitches')
+    def __init__(self, row_num, stitch_count):
+        self.row_num = row_num
+        self.stitch_count = stitch_count
+        self.stitches = []
+    def __repr__(self):
+        return f"RowRecord(row_num={self.row_num},stitch_count={self.stitch_count},stitches={len(self.stitches)})"
+    def stitches_print_string(self):
+        return " ".join(str(stitch_enum) for _, stitch_enum in self.stitches)
+    def codes(self):
+        # the same per-row encoding as CircularChart.to_payload
+        return bytes(stitch_enum.code() for _, stitch_enum in self.stitches)
+    def format(self, max_pad_size):
+        return f"Row {str(self.row_num + 1).zfill(max_pad_size)} ({self.stitch_count}sts): {self.stitches_print_string()}"
+
+def generate_rows(num_rows, starting_stitch_count, rng=random, events=None,
+                  restricted_stitches=CircularChart.stitches_that_may_not_appear_next_to_each_other):
+    """Generate a random chart one row at a time, yielding RowRecords in row order.
+
+    Only the row being filled is held in memory; a stitch that wraps into
+    the next row stays with the row it started in. Draws the same stitches
+    as CircularChart.generate_random_chart for the same rng state.
+    """
+    stitch_counts = stitch_counts_for(num_rows, starting_stitch_count)
+    table = ConstraintTable.compile(restricted_stitches)
+    record = RowRecord(0, stitch_counts[0])
+    for coords, stitch_enum in CircularChart.random_placements(stitch_counts, table, rng, events):
+        while coords.row_num > record.row_num:
+            yield record
+            record = RowRecord(record.row_num + 1, stitch_counts[record.row_num + 1])
+        record.stitches.append((coords.stitch_num, stitch_enum))
+        if events is not None:
+            events(GenerationEvent(EventKind.STITCH_PLACED, coords, stitch_enum))
+    yield record
+    for row_num in range(record.row_num + 1, num_rows):
+        yield RowRecord(row_num, stitch_counts[row_num])
+
+def write_rows(rows, num_rows, file=sys.stdout):
+    """Write each row as it arrives, bottom row first, in the print_chart_2 line format."""
+    max_pad_size = len(str(num_rows + 1))
+    for record in rows:
+        file.write(record.format(max_pad_size))
+        file.write("\n")
+
+def payload_from_rows(rows, num_rows, starting_stitch_count):
+    return (num_rows, starting_stitch_count, tuple(record.codes() for record in rows))
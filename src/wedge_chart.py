@@ -0,0 +1,139 @@
+"""Charts made of identical wedges, stored and generated as a single wedge.
+
+A WedgeChart with repeats N keeps one CircularChart whose rows are 1/N of
+the full chart's (the doubling schedule divides evenly whenever the starting
+stitch count does) and reads the full chart off it on demand, so memory and
+generation time scale with the wedge rather than the circumference.
+"""
+from circular_chart import CircularChart
+from constraint_table import ConstraintTable
+from events import EventKind, GenerationEvent
+import random
+
+class WedgeRow:
+    """Read-only view of one full row of a WedgeChart, like a MappedRow."""
+    def __init__(self, wedge_row, repeats):
+        self._wedge_row = wedge_row
+        self.repeats = repeats
+        self.row_num = wedge_row.row_num
+        self.stitch_count = wedge_row.stitch_count * repeats
+    def __repr__(self):
+        return f"WedgeRow(row_num={self.row_num},stitch_count={self.stitch_count},repeats={self.repeats})"
+    def __len__(self):
+        return len(self._wedge_row.stitches()) * self.repeats
+    def wedge(self):
+        return self._wedge_row
+    def stitch_enums(self):
+        return [stitch.stitch_enum for stitch in self._wedge_row.stitches()] * self.repeats
+    def codes(self):
+        return bytes(stitch.stitch_enum.code() for stitch in self._wedge_row.stitches()) * self.repeats
+    def __getitem__(self, stitch_index):
+        # the stitch covering slot stitch_index, like MappedRow
+        if stitch_index < 0 or stitch_index >= self.stitch_count:
+            raise IndexError(f"Invalid stitch: {stitch_index} (only {self.stitch_count} available)")
+        stitch = self._wedge_row[stitch_index % self._wedge_row.stitch_count]
+        return None if stitch is None else stitch.stitch_enum
+    def stitches_print_string(self):
+        return " ".join([self._wedge_row.stitches_print_string()] * self.repeats)
+    def is_empty(self):
+        return self._wedge_row.is_empty()
+
+class WedgeChart:
+    def __init__(self, num_rows, starting_stitch_count, repeats, wedge=None):
+        # wedge is an existing CircularChart to use as the wedge, e.g. one
+        # read from a payload
+        assert repeats > 0 and starting_stitch_count % repeats == 0, \
+            f"{starting_stitch_count} stitches cannot be split into {repeats} wedges"
+        self.num_rows = num_rows
+        self.starting_stitch_count = starting_stitch_count
+        self.repeats = repeats
+        if wedge is None:
+            wedge = CircularChart(num_rows, starting_stitch_count // repeats)
+        assert wedge.num_rows == num_rows and wedge.starting_stitch_count * repeats == starting_stitch_count, \
+            f"{wedge!r} is not a wedge of {repeats} for this chart"
+        self.wedge = wedge
+        self.__rows = {}
+
+    def __repr__(self):
+        return f"WedgeChart(num_rows={self.num_rows},starting_stitch_count={self.starting_stitch_count}," \
+               f"repeats={self.repeats})"
+
+    def __getitem__(self, row_num):
+        # like CircularChart: None past the last row
+        if row_num < 0 or row_num >= self.num_rows:
+            return None
+        if row_num not in self.__rows:
+            self.__rows[row_num] = WedgeRow(self.wedge[row_num], self.repeats)
+        return self.__rows[row_num]
+
+    def is_empty(self):
+        return self.wedge.is_empty()
+
+    def generate_random_chart(self, events=None, rng=random):
+        """Generate the wedge; events and rng are as for CircularChart.generate_random_chart.
+
+        A wedge row is followed by another copy of itself, so every row is
+        generated as if it starts after a restricted stitch; its first
+        stitch is then allowed after whatever the row ends with.
+        """
+        assert self.is_empty(), "cannot generate a random chart -- it is not empty"
+        table = ConstraintTable.compile(self.wedge.stitches_that_may_not_appear_next_to_each_other)
+        for coords, stitch_enum in CircularChart.random_placements(self.wedge._stitch_counts, table, rng, events,
+                                                                   seam_safe=True):
+            self.wedge[coords.row_num][coords.stitch_num] = stitch_enum
+            if events is not None:
+                events(GenerationEvent(EventKind.STITCH_PLACED, coords, stitch_enum))
+
+    def validate_row(self, row_num):
+        """Whether the full row (every repeat of the wedge) satisfies the row's rules."""
+        row = self.wedge[row_num]
+        automaton = row.rule_automaton()
+        wedge = [stitch.stitch_enum for stitch in row.stitches()]
+        state = automaton.start
+        # a repeat that ends in the state it started from leaves every later
+        # repeat doing the same, so the loop can stop there
+        for _ in range(self.repeats):
+            next_state = automaton.run(wedge, state)
+            if next_state is None or next_state == state:
+                state = next_state
+                break
+            state = next_state
+        return automaton.is_accepting(state)
+
+    def verify(self):
+        """Whether every row is complete and satisfies its rules around the full circle."""
+        for row_num in range(self.num_rows):
+            row = self.wedge[row_num]
+            if row.current_size() != row.stitch_count or not self.validate_row(row_num):
+                return False
+        return True
+
+    def chart_print_string(self):
+        max_pad_size = len(str(self.num_rows + 1))
+        return "\n".join(f"Row {str(row_num + 1).zfill(max_pad_size)} ({self[row_num].stitch_count}sts): "
+                         f"{self[row_num].stitches_print_string()}"
+                         for row_num in range(self.num_rows - 1, -1, -1))
+
+    def wedge_print_string(self):
+        # the compressed form: each row's wedge and the repeat count
+        max_pad_size = len(str(self.num_rows + 1))
+        return "\n".join(f"Row {str(row_num + 1).zfill(max_pad_size)} ({self[row_num].stitch_count}sts): "
+                         f"*{self.wedge[row_num].stitches_print_string()}; rep from * {self.repeats} times"
+                         for row_num in range(self.num_rows - 1, -1, -1))
+
+    def to_wedge_payload(self):
+        return (self.repeats, self.wedge.to_payload())
+
+    @classmethod
+    def from_wedge_payload(cls, wedge_payload):
+        repeats, (num_rows, wedge_starting_stitch_count, rows) = wedge_payload
+        wedge = CircularChart.from_payload((num_rows, wedge_starting_stitch_count, rows))
+        return cls(num_rows, wedge_starting_stitch_count * repeats, repeats, wedge)
+
+    def to_payload(self):
+        # the expanded chart, as CircularChart.to_payload would give it
+        return (self.num_rows, self.starting_stitch_count,
+                tuple(self[row_num].codes() for row_num in range(self.num_rows)))
+
+    def to_chart(self):
+        return CircularChart.from_payload(self.to_payload())
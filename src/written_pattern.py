@@ -0,0 +1,124 @@
+"""Written knitting instructions for a chart, one line per row.
+
+Each row is read as its sequence of stitch codes and written the way a
+pattern would: runs of knits and purls as "k14" and "p3", repeated groups
+of stitches as "[k2tog, yo] 3 times", and a row that is one group repeated
+all the way round as "*k2tog, yo; rep from * to end". Runs are found with a
+regular expression over the codes and whole-row repeats by comparing byte
+strings, so the Python-level work for a row grows with the number of runs
+in it rather than its number of stitches; a periodic row only has its
+repeat written out.
+
+write_pattern and write_payload_pattern stream the rows, first row first,
+to a path or a text file object. Lines are joined and written in blocks,
+and only one row's codes are held at a time.
+"""
+from circular_chart import stitch_counts_for
+from stitch import StitchEnum
+import re
+
+STITCHES = tuple(StitchEnum)
+
+# abbreviations as written in patterns, where they differ from the chart's
+_WRITTEN = {
+    StitchEnum.KNIT: "k",
+    StitchEnum.PURL: "p",
+    StitchEnum.KTBL: "k1 tbl",
+    StitchEnum.PTBL: "p1 tbl",
+    StitchEnum.BOBBLE: "mb",
+}
+WRITTEN_NAMES = tuple(_WRITTEN.get(stitch, stitch.abbreviation) for stitch in STITCHES)
+# stitches written with their run length ("k14") rather than repeated
+_COUNTED = frozenset((StitchEnum.KNIT.code(), StitchEnum.PURL.code()))
+
+_RUN = re.compile(rb"(.)\1*", re.S)
+# longest group of runs looked for when collapsing repeats within a row
+MAX_GROUP_RUNS = 8
+_BLOCK_SIZE = 1 << 16
+
+def _runs(codes):
+    # [(code, length)] of the row's runs of identical stitches
+    return [(codes[match.start()], match.end() - match.start()) for match in _RUN.finditer(codes)]
+
+def _run_string(code, length):
+    if code in _COUNTED:
+        return f"{WRITTEN_NAMES[code]}{length}"
+    if length == 1:
+        return WRITTEN_NAMES[code]
+    return f"[{WRITTEN_NAMES[code]}] {length} times"
+
+def _runs_string(runs):
+    # greedily replaces the group of runs that repeats over the most runs
+    # at each position with "[group] n times"
+    parts = []
+    position = 0
+    while position < len(runs):
+        best_size, best_times = 1, 1
+        for size in range(2, min(MAX_GROUP_RUNS, (len(runs) - position) // 2) + 1):
+            group = runs[position:position + size]
+            times = 1
+            while runs[position + times * size:position + (times + 1) * size] == group:
+                times += 1
+            if times > 1 and size * times > best_size * best_times:
+                best_size, best_times = size, times
+        group = ", ".join(_run_string(code, length) for code, length in runs[position:position + best_size])
+        parts.append(group if best_times == 1 else f"[{group}] {best_times} times")
+        position += best_size * best_times
+    return ", ".join(parts)
+
+def _divisors(length):
+    small = [size for size in range(1, int(length ** 0.5) + 1) if length % size == 0]
+    return sorted(set(small + [length // size for size in small]))
+
+def _period(codes):
+    # length of the shortest group the row is made of, repeated whole
+    length = len(codes)
+    for size in _divisors(length):
+        if codes[:size] * (length // size) == codes:
+            return size
+    return length
+
+def row_instructions(codes):
+    """Written instructions for a row given as bytes of stitch codes (see CircularChart.to_payload)."""
+    codes = bytes(codes)
+    size = _period(codes)
+    if size < len(codes):
+        runs = _runs(codes[:size])
+        # a row of one stitch reads better as "k14" than as a repeat
+        if len(runs) > 1:
+            return f"*{_runs_string(runs)}; rep from * to end"
+    return _runs_string(_runs(codes))
+
+def write_pattern_rows(rows, num_rows, target):
+    """Write (stitch_count, codes) rows, first row first, to a path or a text file object."""
+    if isinstance(target, str):
+        file, owned = open(target, "w", buffering=_BLOCK_SIZE), True
+    else:
+        file, owned = target, False
+    max_pad_size = len(str(num_rows + 1))
+    try:
+        block = []
+        block_size = 0
+        for row_num, (stitch_count, codes) in enumerate(rows):
+            line = f"Row {str(row_num + 1).zfill(max_pad_size)} ({stitch_count}sts): {row_instructions(codes)}\n"
+            block.append(line)
+            block_size += len(line)
+            if block_size >= _BLOCK_SIZE:
+                file.write("".join(block))
+                block = []
+                block_size = 0
+        file.write("".join(block))
+    finally:
+        if owned:
+            file.close()
+
+def write_pattern(chart, target):
+    """Write a CircularChart's rows as written instructions (see write_pattern_rows)."""
+    rows = ((chart[row_num].stitch_count, bytes(stitch.stitch_enum.code() for stitch in chart[row_num].stitches()))
+            for row_num in range(chart.num_rows))
+    write_pattern_rows(rows, chart.num_rows, target)
+
+def write_payload_pattern(payload, target):
+    """Write a chart payload (see CircularChart.to_payload) as written instructions."""
+    num_rows, starting_stitch_count, rows = payload
+    write_pattern_rows(zip(stitch_counts_for(num_rows, starting_stitch_count), rows), num_rows, target)
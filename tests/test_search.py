@@ -0,0 +1,22 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from circular_chart import CircularChart
+from search import LACE_CODES, LACE_STITCHES, MinimumShare, search
+
+class LaceShareSearchTest(unittest.TestCase):
+    def test_feasible_lace_share_is_found(self):
+        # uniform charts this size reach this much lace about once in several thousand
+        for seed in range(3):
+            payload = search(8, 8, [MinimumShare(LACE_STITCHES, 0.15)], seed=seed)
+            self.assertIsNotNone(payload)
+            chart = CircularChart.from_payload(payload)
+            self.assertEqual(chart.to_payload(), payload)
+            codes = b"".join(payload[2])
+            self.assertGreaterEqual(sum(codes.count(code) for code in LACE_CODES), 0.15 * len(codes))
+
+if __name__ == "__main__":
+    unittest.main()